@@ -12,7 +12,7 @@ from email.mime.multipart import MIMEMultipart
 from faker import Faker
 import lorem
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
 from dotenv import load_dotenv
 
@@ -333,13 +333,18 @@ You're receiving this because you're subscribed to notifications."""
 {random.choice(['Talk soon', 'Cheers', 'Best', 'Take care'])},
 {self.fake.first_name()}"""
     
-    def send_email(self, email_data: Dict):
-        """Wysyła email przez SMTP"""
+    def _build_message(self, email_data: Dict) -> MIMEMultipart:
+        """Buduje wiadomość MIME z metadanych emaila"""
         msg = MIMEMultipart()
         msg['From'] = email_data['sender']
         msg['To'] = email_data['recipient']
         msg['Subject'] = email_data['subject']
         msg.attach(MIMEText(email_data['body'], 'plain'))
+        return msg
+
+    def send_email(self, email_data: Dict):
+        """Wysyła email przez SMTP"""
+        msg = self._build_message(email_data)
         
         try:
             with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
@@ -398,20 +403,46 @@ You're receiving this because you're subscribed to notifications."""
         return random.choices(categories, weights=weights)[0]
     
     def send_all_emails(self, delay: float = 0.1):
-        """Wysyła wszystkie wygenerowane emaile"""
-        print(f"\n📤 Wysyłanie {len(self.generated_emails)} emaili...")
+        """Wysyła wszystkie wygenerowane emaile (jedno połączenie SMTP, `delay` sekund między wiadomościami)"""
+        return self.send_all_emails_pooled(delay=delay)
+    
+    def send_all_emails_pooled(self, delay: float = 0, recycle_every: int = 1000):
+        """Wysyła wszystkie emaile jednym połączeniem SMTP (EHLO raz), odnawianym co `recycle_every` wiadomości"""
+        print(f"\n📤 Wysyłanie {len(self.generated_emails)} emaili (jedno połączenie SMTP)...")
         
         sent = 0
         failed = 0
+        server = None
+        in_session = 0
         
-        for i, email in enumerate(self.generated_emails, 1):
-            print(f"[{i}/{len(self.generated_emails)}] ", end='')
-            if self.send_email(email):
-                sent += 1
-            else:
-                failed += 1
-            
-            time.sleep(delay)  # Małe opóźnienie między emailami
+        try:
+            for i, email in enumerate(self.generated_emails, 1):
+                print(f"[{i}/{len(self.generated_emails)}] ", end='')
+                try:
+                    if server is None or in_session >= recycle_every:
+                        if server is not None:
+                            server.quit()
+                        server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+                        server.ehlo()
+                        in_session = 0
+                    server.send_message(self._build_message(email))
+                    in_session += 1
+                    sent += 1
+                    print(f"✉️  Sent: [{email['category']}] {email['subject'][:50]}")
+                except (smtplib.SMTPException, OSError) as e:
+                    print(f"❌ Failed to send: {e}")
+                    failed += 1
+                    if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)):
+                        server = None  # Połącz ponownie przy następnej wiadomości
+                
+                if delay:
+                    time.sleep(delay)
+        finally:
+            if server is not None:
+                try:
+                    server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
         
         print(f"\n✅ Wysłano: {sent}, ❌ Błędy: {failed}")
         return sent, failed
@@ -443,7 +474,11 @@ You're receiving this because you're subscribed to notifications."""
         
         print(f"📝 Metadane zapisane do {filename}")
 
-def main():
+# Wartości domyślne opcji run() - te same co w parserze main()
+_RUN_DEFAULTS = {'host': 'localhost', 'port': 1025, 'count': 50, 'spam_ratio': 0.2, 'delay': 0.1, 'no_send': False}
+
+
+def main(argv: Optional[List[str]] = None):
     """Główna funkcja"""
     import argparse
     
@@ -455,16 +490,22 @@ def main():
     parser.add_argument('--delay', type=float, default=0.1, help='Opóźnienie między emailami (s)')
     parser.add_argument('--no-send', action='store_true', help='Tylko generuj, nie wysyłaj')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    run(vars(args))
+
+
+def run(config: Dict):
+    """Generuje i wysyła emaile dla słownika opcji (klucze jak atrybuty argparse), bez parsowania argv."""
+    cfg = {**_RUN_DEFAULTS, **config}
 
     # Załaduj zmienne środowiskowe z .env (jeśli istnieje)
     load_dotenv()
     
     # Użyj zmiennych środowiskowych jeśli są dostępne
-    smtp_host = os.environ.get('SMTP_HOST', args.host)
-    smtp_port = int(os.environ.get('SMTP_PORT', args.port))
-    num_emails = int(os.environ.get('NUM_EMAILS', args.count))
-    spam_ratio = float(os.environ.get('SPAM_RATIO', args.spam_ratio))
+    smtp_host = os.environ.get('SMTP_HOST', cfg['host'])
+    smtp_port = int(os.environ.get('SMTP_PORT', cfg['port']))
+    num_emails = int(os.environ.get('NUM_EMAILS', cfg['count']))
+    spam_ratio = float(os.environ.get('SPAM_RATIO', cfg['spam_ratio']))
     
     print("="*50)
     print("📧 TEST EMAIL GENERATOR")
@@ -481,8 +522,8 @@ def main():
     generator.generate_batch(num_emails, spam_ratio)
     
     # Wyślij emaile (chyba że --no-send)
-    if not args.no_send:
-        generator.send_all_emails(delay=args.delay)
+    if not cfg['no_send']:
+        generator.send_all_emails(delay=cfg['delay'])
     else:
         print("\n⏭️  Pomijam wysyłanie (--no-send)")
     
@@ -10,12 +10,10 @@ import logging
 import argparse
 import os
 import sys
-import re
 import time
-import unicodedata
 import string
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from sklearn.feature_extraction.text import TfidfVectorizer
 import warnings
 from dotenv import load_dotenv
@@ -23,7 +21,7 @@ from llmass.organizer.repair import repair_mailbox as _repair_mailbox
 from llmass.organizer.folders import FolderManager
 from llmass.organizer.corruption import check_and_handle_corruption
 from llmass.organizer.fetcher import fetch_and_filter
-from llmass.organizer.actions import move_email as _move_email_action
+from llmass.organizer.actions import move_email as _move_email_action, supports_move as _supports_move
 from llmass.organizer.filters import (
     is_spam as _filter_is_spam,
     has_sufficient_text as _filter_has_sufficient_text,
@@ -60,6 +58,10 @@ class EmailOrganizer:
         self.tfidf_max_features = int(os.getenv('TFIDF_MAX_FEATURES', '100'))
         self.stopwords_mode = (os.getenv('STOPWORDS', 'none') or 'none').lower()
         self.vectorizer = self._make_vectorizer()
+        # Co ile wywołań kategoryzacji ponownie dopasować słownik TF-IDF (0 = nigdy)
+        self.refit_every = int(os.getenv('TFIDF_REFIT_EVERY', '20'))
+        # Ostatnie dopasowanie TF-IDF (skrót korpusu + konfiguracja) - tylko dla tej instancji
+        self._tfidf_memo = None
         # Parametry kategoryzacji (można nadpisać argumentami lub .env)
         self.similarity_threshold = similarity_threshold if similarity_threshold is not None else float(os.getenv('SIMILARITY_THRESHOLD', '0.25'))
         self.min_cluster_size = min_cluster_size if min_cluster_size is not None else int(os.getenv('MIN_CLUSTER_SIZE', '2'))
@@ -73,6 +75,14 @@ class EmailOrganizer:
         self.category_sample_limit = int(os.getenv('CATEGORY_SAMPLE_LIMIT', '50'))
         # Sprzątanie: usuwaj puste foldery kategorii przy starcie
         self.cleanup_empty_categories = os.getenv('CLEANUP_EMPTY_CATEGORY_FOLDERS', 'true').lower() in ('1', 'true', 'yes')
+        # Ile sekund wynik LIST jest współdzielony między operacjami na folderach (0 = bez cache)
+        self.folder_cache_ttl = float(os.getenv('FOLDER_CACHE_TTL', '60'))
+        self._folder_cache = None
+        # Równoległe pobieranie próbek z folderów kategorii przez dodatkowe połączenia (0/1 = sekwencyjnie)
+        self.folder_fetch_workers = int(os.getenv('FOLDER_FETCH_WORKERS', '0'))
+        self._extra_clients = []
+        # Obsługa IMAP MOVE (None = jeszcze nie sprawdzono)
+        self.has_move = None
         # Tryb dry-run (CLI > ENV)
         self.dry_run = (dry_run if dry_run is not None else (os.getenv('DRY_RUN', '').lower() in ('1', 'true', 'yes')))
         # Minimalne wymagania treści do porównań
@@ -81,8 +91,19 @@ class EmailOrganizer:
         # Limity dla wykrywania aktywnych konwersacji
         self.conversation_history_days = int(os.getenv('CONVERSATION_HISTORY_DAYS', '360'))
         self.conversation_history_limit = int(os.getenv('CONVERSATION_HISTORY_LIMIT', '300'))
+        # Liczba wiadomości pobieranych jednym poleceniem FETCH
+        self.fetch_batch_size = int(os.getenv('FETCH_BATCH_SIZE', '100'))
+        # Ile bajtów treści pobierać z każdej wiadomości (0 = całość)
+        self.fetch_body_bytes = int(os.getenv('FETCH_BODY_BYTES', '8192'))
+        # Równoległe pobieranie przez dodatkowe połączenia aioimaplib (opcjonalne)
+        self.async_fetch = os.getenv('ASYNC_FETCH', 'false').lower() in ('1', 'true', 'yes')
+        self.async_fetch_connections = int(os.getenv('ASYNC_FETCH_CONNECTIONS', '4'))
+        # Liczba wątków parsujących; >0 włącza też pobieranie następnego batcha w tle (0 = sekwencyjnie)
+        self.parse_workers = int(os.getenv('PARSE_WORKERS', '0'))
         # Flag dla używania sekwencyjnych numerów zamiast UIDs (przy corruption)
         self.use_sequence_numbers = False
+        # Aktualnie wybrany folder (SELECT) - używany przez dodatkowe połączenia
+        self.current_folder = 'INBOX'
         # Verbose switch
         self.verbose = verbose
         # Logger
@@ -141,6 +162,9 @@ class EmailOrganizer:
             self.imap.login(self.email_address, self.password)
             # Wrap session with retry/backoff client
             self.client = ImapClient(self.imap, retries=2, backoff=0.5, verbose=self.verbose)
+            # Wykryj obsługę MOVE (RFC 6851) raz na połączenie
+            self.has_move = None
+            _supports_move(self)
             if self.verbose:
                 print(f"✅ Połączono z {self.imap_server}")
             # Zcache'uj delimiter
@@ -157,10 +181,10 @@ class EmailOrganizer:
             print(f"❌ Błąd połączenia: {e}")
             return False
     
-    def get_folders(self) -> List[str]:
-        """Deleguje do FolderManager.get_folders()"""
+    def get_folders(self, subscribed_only: bool = False) -> List[str]:
+        """Deleguje do FolderManager.get_folders() (subscribed_only: LSUB zamiast pełnego LIST)"""
         if self.folders:
-            return self.folders.get_folders()
+            return self.folders.get_folders(subscribed_only=subscribed_only)
         return []
     
     def _get_hierarchy_delimiter(self) -> str:
@@ -182,94 +206,30 @@ class EmailOrganizer:
         return self._delim_cache
 
     def _sanitize_folder_component(self, s: str, delim: str = None) -> str:
-        """Sanityzacja komponentu nazwy folderu do ASCII (bezpieczne znaki).
-        Zamienia znak delimitera na '_' aby uniknąć dodatkowych poziomów.
-        """
-        if not s:
-            return 'Category'
-        # Usuń diakrytyki i znaki nie-ASCII
-        norm = unicodedata.normalize('NFKD', s)
-        ascii_only = ''.join(c for c in norm if not unicodedata.combining(c) and ord(c) < 128)
-        # Dopuść wybrane znaki
-        allowed = set(string.ascii_letters + string.digits + '._- ')
-        cleaned = ''.join(ch if ch in allowed else '_' for ch in ascii_only)
-        # Zastąp spacje podkreślnikami i przytnij
-        cleaned = re.sub(r'\s+', '_', cleaned).strip('_')
-        # Usuń delimiter hierarchii z komponentu (np. '.')
-        if delim:
-            cleaned = cleaned.replace(delim, '_')
-        # Zredukuj wielokrotne podkreślenia do jednego
-        cleaned = re.sub(r'_+', '_', cleaned)
-        return cleaned or 'Category'
+        """Deleguje do FolderManager._sanitize_folder_component()"""
+        if self.folders:
+            return self.folders._sanitize_folder_component(s, delim)
+        return 'Category'
 
     def _is_safe_category_segment(self, seg: str) -> bool:
         """Zwraca True, jeśli segment kategorii zawiera wyłącznie dozwolone znaki.
         Dopuszczalne: litery, cyfry, '.', '_', '-'
         """
-        if not seg:
-            return False
-        allowed = set(string.ascii_letters + string.digits + '._-')
-        return all((c in allowed) for c in seg)
+        if self.folders:
+            return self.folders._is_safe_category_segment(seg)
+        return bool(seg) and frozenset(string.ascii_letters + string.digits + '._-').issuperset(seg)
 
     def _encode_mailbox(self, name: str) -> str:
-        """Zwraca nazwę folderu ograniczoną do ASCII (bezpieczną dla wielu serwerów IMAP).
-        Jeżeli nazwa zawiera znaki spoza ASCII, zostaje zsanityzowana.
-        """
-        if isinstance(name, (bytes, bytearray)):
-            try:
-                name = bytes(name).decode('ascii')
-            except Exception:
-                name = bytes(name).decode('utf-8', errors='ignore')
-        if all(ord(c) < 128 for c in name):
-            return name
-        # Sanityzuj całą ścieżkę segment po segmencie (z zachowaniem delimitera)
-        delim = self._get_hierarchy_delimiter()
-        parts = name.split(delim)
-        if not parts:
-            return self._sanitize_folder_component(name, delim)
-        sanitized = [parts[0]]
-        for seg in parts[1:]:
-            sanitized.append(self._sanitize_folder_component(seg, delim))
-        return delim.join(sanitized)
+        """Deleguje do FolderManager._encode_mailbox()"""
+        if self.folders:
+            return self.folders._encode_mailbox(name)
+        return name
 
     def _parse_list_line(self, raw) -> Tuple[List[str], str, str]:
-        """Parsuje linię odpowiedzi LIST do (flags, delimiter, name).
-        Zwraca ([], '/', '') jeśli nie uda się sparsować.
-        """
-        try:
-            line = raw.decode(errors='ignore') if isinstance(raw, (bytes, bytearray)) else str(raw)
-            # Przykłady:
-            # (\HasNoChildren) "." "INBOX.Sent"
-            # (\HasChildren) "/" INBOX
-            # (\Noselect \HasChildren) "/" "[Gmail]"
-            m = re.match(r"\((?P<flags>[^)]*)\)\s+\"(?P<delim>[^\"]*)\"\s+(?P<name>.*)$", line)
-            if not m:
-                # Spróbuj bez cudzysłowów wokół delim
-                m2 = re.match(r"\((?P<flags>[^)]*)\)\s+(?P<delim>NIL|[^\s]+)\s+(?P<name>.*)$", line)
-                if not m2:
-                    return ([], '/', '')
-                flags_str = m2.group('flags') or ''
-                delim = m2.group('delim')
-                name = m2.group('name').strip()
-            else:
-                flags_str = m.group('flags') or ''
-                delim = m.group('delim')
-                name = m.group('name').strip()
-
-            # Usuń otaczające cudzysłowy z nazwy jeśli są
-            if name.startswith('"') and name.endswith('"') and len(name) >= 2:
-                name = name[1:-1]
-            # Zamień escapeowane cudzysłowy
-            name = name.replace('\\"', '"')
-
-            # Delim może być NIL (brak hierarchii)
-            if delim.upper() == 'NIL':
-                delim = self._get_hierarchy_delimiter() or '/'
-
-            flags = [f for f in flags_str.split() if f]
-            return (flags, delim, name)
-        except Exception:
-            return ([], '/', '')
+        """Deleguje do FolderManager._parse_list_line()"""
+        if self.folders:
+            return self.folders._parse_list_line(raw)
+        return ([], '/', '')
 
     def _resolve_spam_folder_name(self) -> str:
         """Deleguje do FolderManager._resolve_spam_folder_name()"""
@@ -312,20 +272,31 @@ class EmailOrganizer:
                 pass
         return texts
 
-    def _fetch_messages_from_folder(self, folder: str, limit: int) -> List[Dict]:
-        """Pobiera do 'limit' najnowszych wiadomości: subject, body, from."""
+    def _open_extra_client(self) -> ImapClient:
+        """Otwiera dodatkowe połączenie IMAP (np. dla równoległych pobrań); zamykane w disconnect()."""
+        session = ImapSession(self.imap_server, ssl=getattr(self.imap, 'ssl', True))
+        session.connect()
+        session.login(self.email_address, self.password)
+        return ImapClient(session, retries=2, backoff=0.5, verbose=self.verbose)
+
+    def _fetch_messages_from_folder(self, folder: str, limit: int, client: ImapClient = None) -> List[Dict]:
+        """Pobiera do 'limit' najnowszych wiadomości: subject, body, from.
+        Z podanym `client` (dodatkowe połączenie) folder otwierany jest tylko do odczytu.
+        """
         msgs: List[Dict] = []
+        own = client is None
+        client = self.client if own else client
         try:
-            typ, _ = self.client.safe_select(folder)
+            typ, _ = client.safe_select(folder) if own else client.safe_select(folder, readonly=True)
             if typ != 'OK':
                 return msgs
-            res, data = self.client.safe_uid('SEARCH', None, 'ALL')
+            res, data = client.safe_uid('SEARCH', None, 'ALL')
             if res != 'OK' or not data or not data[0]:
                 return msgs
             uids = data[0].split()
             take = uids[-limit:] if limit and len(uids) > limit else uids
             for uid in take:
-                r, d = self.client.safe_uid('FETCH', uid, '(RFC822)')
+                r, d = client.safe_uid('FETCH', uid, '(RFC822)')
                 if r != 'OK' or not d or not d[0]:
                     continue
                 raw = d[0][1]
@@ -335,10 +306,11 @@ class EmailOrganizer:
         except Exception:
             pass
         finally:
-            try:
-                self.client.safe_select('INBOX')
-            except Exception:
-                pass
+            if own:
+                try:
+                    self.client.safe_select('INBOX')
+                except Exception:
+                    pass
         return msgs
 
     def _list_category_folders(self) -> List[str]:
@@ -481,10 +453,8 @@ class EmailOrganizer:
             return True
         
         # Sprawdź References (łańcuch konwersacji)
-        if references:
-            for ref_id in references.split():
-                if ref_id.strip() in sent_drafts_ids:
-                    return True
+        if references and not sent_drafts_ids.isdisjoint(references.split()):
+            return True
         
         return False
     
@@ -500,8 +470,9 @@ class EmailOrganizer:
         """Deleguje przenoszenie emaila do llmass.organizer.actions.move_email"""
         return _move_email_action(self, email_id, target_folder)
     
-    def organize_mailbox(self, limit: int = 100, since_days: int = 7, since_date: str = None, folder: str = None, include_subfolders: bool = False):
-        """Główna funkcja organizująca skrzynkę"""
+    def organize_mailbox(self, limit: int = 100, since_days: int = 7, since_date: str = None, folder: str = None, include_subfolders: bool = False,
+                         since_uid: Optional[int] = None):
+        """Główna funkcja organizująca skrzynkę (since_uid: tylko wiadomości o UID > since_uid)"""
         if self.verbose:
             print("\n🔄 Rozpoczynam organizację skrzynki email...")
         # Migruj istniejące niebezpieczne foldery kategorii do bezpiecznych nazw
@@ -530,6 +501,7 @@ class EmailOrganizer:
         if result != 'OK':
             print(f"❌ Nie można otworzyć folderu {selected_folder}")
             return
+        self.current_folder = selected_folder
         
         # Wyczyść usunięte emaile przed rozpoczęciem (EXPUNGE)
         try:
@@ -560,6 +532,10 @@ class EmailOrganizer:
         search_criteria = ['ALL']
         if imap_since:
             search_criteria = ['SINCE', imap_since]
+        # Tryb przyrostowy: tylko UID nowsze niż ostatnio przetworzone
+        if since_uid is not None:
+            uid_range = ['UID', f"{int(since_uid) + 1}:*"]
+            search_criteria = uid_range if search_criteria == ['ALL'] else uid_range + search_criteria
         
         # Wyszukaj emaile
         result, data = self.client.safe_uid('SEARCH', None, *search_criteria)
@@ -569,6 +545,9 @@ class EmailOrganizer:
             return
         
         email_ids = data[0].split()
+        if since_uid is not None:
+            # 'N:*' zawsze obejmuje najwyższy UID, nawet gdy jest <= since_uid
+            email_ids = [u for u in email_ids if int(u) > int(since_uid)]
         if not email_ids:
             if self.verbose:
                 print("📭 Brak emaili spełniających kryteria")
@@ -622,6 +601,12 @@ class EmailOrganizer:
     
     def disconnect(self):
         """Rozłącz z serwerem"""
+        for extra in self._extra_clients:
+            try:
+                extra.session.logout()
+            except Exception:
+                pass
+        self._extra_clients = []
         if self.imap:
             self.imap.close()
             self.imap.logout()
@@ -629,11 +614,17 @@ class EmailOrganizer:
                 print("👋 Rozłączono z serwerem")
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Email Organizer Bot')
-    # Załaduj .env aby mieć dostęp do domyślnych wartości
-    load_dotenv()
+# Wartości domyślne opcji run() - te same co w parserze main()
+_RUN_DEFAULTS = {
+    'email': None, 'password': None, 'server': None, 'dry_run': False, 'limit': None,
+    'since_days': None, 'since_date': None, 'similarity_threshold': None, 'min_cluster_size': None,
+    'min_cluster_fraction': None, 'folder': None, 'include_subfolders': False, 'repair': False,
+    'force': False, 'verbose': False,
+}
 
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Email Organizer Bot')
     parser.add_argument('--email', required=False, default=None, help='Adres email')
     parser.add_argument('--password', required=False, default=None, help='Hasło do skrzynki')
     parser.add_argument('--server', required=False, default=None, help='Serwer IMAP (opcjonalnie)')
@@ -662,7 +653,15 @@ def main():
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='Tryb verbose (pełne logi). Bez tej flagi pokazywane są tylko błędy i skróty.')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    run(vars(args))
+
+
+def run(config: Dict):
+    """Uruchamia organizer (lub naprawę przy repair=True) dla słownika opcji, bez ponownego parsowania argv."""
+    args = argparse.Namespace(**{**_RUN_DEFAULTS, **config})
+    # Załaduj .env aby mieć dostęp do domyślnych wartości
+    load_dotenv()
 
     # Fallback do zmiennych środowiskowych (z .env) jeśli brak parametrów
     email_arg = args.email or os.getenv('EMAIL_ADDRESS')
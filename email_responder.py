@@ -63,6 +63,10 @@ class EmailResponder:
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.tokenizer = None
         self.model = None
+        # Liczba promptów generowanych jednym model.generate() w process_emails
+        self.response_batch_size = max(1, int(os.getenv('RESPONSE_BATCH_SIZE', '8')))
+        # torch.compile modelu po załadowaniu (opcjonalnie; kompilacja kosztuje przy pierwszym generate)
+        self.torch_compile = os.getenv('TORCH_COMPILE', '0').lower() in ('1', 'true', 'yes')
         
         # Parametry generowania odpowiedzi
         self.generation_params = {
@@ -125,17 +129,20 @@ NAPISZ ODPOWIEDŹ:"""
         
         return smtp_servers.get(domain, f'smtp.{domain}')
     
-    def load_model(self):
-        """Ładuje model LLM"""
+    def load_model(self, local_files_only: bool = False):
+        """Ładuje model LLM (local_files_only: tylko z lokalnego cache HF, bez pobierania)"""
         if not TRANSFORMERS_AVAILABLE:
             print("⚠️  Transformers nie jest dostępne - używam trybu mock")
             return False
+        
+        if self.model is not None and self.tokenizer is not None:
+            return True  # Już załadowany - nie wczytuj wag ponownie
             
         print(f"🤖 Ładowanie modelu {self.model_name}...")
         print(f"   Używam urządzenia: {self.device}")
         
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, local_files_only=local_files_only)
             
             # Konfiguracja dla mniejszych modeli
             if "7b" in self.model_name.lower() or "8b" in self.model_name.lower():
@@ -143,12 +150,14 @@ NAPISZ ODPOWIEDŹ:"""
                     self.model_name,
                     dtype=torch.float16 if self.device == "cuda" else torch.float32,
                     device_map="auto" if self.device == "cuda" else None,
-                    low_cpu_mem_usage=True
+                    low_cpu_mem_usage=True,
+                    local_files_only=local_files_only
                 )
             else:
                 self.model = AutoModelForCausalLM.from_pretrained(
                     self.model_name,
-                    device_map="auto"
+                    device_map="auto",
+                    local_files_only=local_files_only
                 )
             
             # Ustaw pad_token, jeśli brak – wiele modeli GPT używa EOS jako PAD
@@ -167,6 +176,12 @@ NAPISZ ODPOWIEDŹ:"""
             if self.device == "cpu":
                 self.model = self.model.to(self.device)
             
+            if self.torch_compile and hasattr(torch, 'compile'):
+                try:
+                    self.model = torch.compile(self.model)
+                except Exception as e:
+                    print(f"⚠️  torch.compile niedostępne, używam modelu bez kompilacji: {e}")
+            
             print("✅ Model załadowany pomyślnie!")
             return True
             
@@ -323,12 +338,8 @@ NAPISZ ODPOWIEDŹ:"""
         
         return history
     
-    def generate_response_with_llm(self, email_content: Dict) -> str:
-        """Generuje odpowiedź używając modelu LLM"""
-        if not TRANSFORMERS_AVAILABLE or not self.model:
-            # Tryb mock gdy model nie jest załadowany lub transformers niedostępne
-            return self._generate_mock_response(email_content)
-        
+    def _build_prompt(self, email_content: Dict) -> str:
+        """Buduje prompt z treści emaila i historii korespondencji z nadawcą"""
         # Pobierz historię korespondencji z tym nadawcą
         sender_email = email_content.get('from', '')
         history_limit = int(os.getenv('CONVERSATION_HISTORY_LIMIT', '3'))
@@ -346,12 +357,28 @@ NAPISZ ODPOWIEDŹ:"""
             history_text += "\n"
         
         # Przygotuj prompt
-        prompt = self.prompt_template.format(
+        return self.prompt_template.format(
             sender=email_content.get('from', 'Nieznany'),
             subject=email_content.get('subject', 'Brak tematu'),
             body=email_content.get('body', '')[:1000],  # Limit długości
             history=history_text
         )
+
+    def _max_new_tokens(self) -> int:
+        """Limit nowych tokenów; na GPU przycinany do 1024, by uniknąć OOM"""
+        max_new = int(self.generation_params.get('max_new_tokens', 500))
+        if self.device == "cuda" and max_new > 1024:
+            print("⚠️  Ograniczam max_new_tokens na GPU do 1024, aby uniknąć OOM")
+            max_new = 1024
+        return max_new
+
+    def generate_response_with_llm(self, email_content: Dict) -> str:
+        """Generuje odpowiedź używając modelu LLM"""
+        if not TRANSFORMERS_AVAILABLE or not self.model:
+            # Tryb mock gdy model nie jest załadowany lub transformers niedostępne
+            return self._generate_mock_response(email_content)
+        
+        prompt = self._build_prompt(email_content)
         
         # Tokenizacja
         inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=1024)
@@ -362,10 +389,7 @@ NAPISZ ODPOWIEDŹ:"""
         attention_mask = inputs.get("attention_mask", torch.ones_like(inputs["input_ids"]))
 
         # Ustal bezpieczny limit tokenów na GPU, by uniknąć OOM
-        max_new = int(self.generation_params.get('max_new_tokens', 500))
-        if self.device == "cuda" and max_new > 1024:
-            print("⚠️  Ograniczam max_new_tokens na GPU do 1024, aby uniknąć OOM")
-            max_new = 1024
+        max_new = self._max_new_tokens()
 
         # Generowanie odpowiedzi z obsługą OOM
         try:
@@ -402,6 +426,63 @@ NAPISZ ODPOWIEDŹ:"""
         )
         
         return response.strip()
+
+    def generate_responses_batch(self, emails: List[Dict], batch_size: Optional[int] = None) -> List[str]:
+        """Generuje odpowiedzi dla wielu emaili - jedno model.generate() na paczkę promptów.
+
+        Prompty są dopełniane z lewej (modele decoder-only generują od końca sekwencji),
+        więc odpowiedź każdego zaczyna się w tej samej kolumnie wyjścia.
+        """
+        if not TRANSFORMERS_AVAILABLE or not self.model:
+            return [self._generate_mock_response(e) for e in emails]
+        
+        batch_size = max(1, int(batch_size or self.response_batch_size))
+        max_new = self._max_new_tokens()
+        responses: List[str] = []
+        for start in range(0, len(emails), batch_size):
+            chunk = emails[start:start + batch_size]
+            prompts = [self._build_prompt(e) for e in chunk]
+            padding_side = getattr(self.tokenizer, 'padding_side', 'right')
+            self.tokenizer.padding_side = 'left'
+            try:
+                inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True, max_length=1024)
+            finally:
+                self.tokenizer.padding_side = padding_side
+            if self.device == "cuda":
+                inputs = inputs.to(self.device)
+            
+            try:
+                with torch.no_grad():
+                    outputs = self.model.generate(
+                        inputs.input_ids,
+                        attention_mask=inputs["attention_mask"],
+                        max_new_tokens=max_new,
+                        temperature=self.generation_params['temperature'],
+                        top_p=self.generation_params['top_p'],
+                        do_sample=self.generation_params['do_sample'],
+                        repetition_penalty=self.generation_params['repetition_penalty'],
+                        pad_token_id=self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else self.tokenizer.eos_token_id
+                    )
+            except torch.cuda.OutOfMemoryError:
+                print("❗ CUDA OOM podczas generowania paczki. Używam mock response...")
+                try:
+                    if torch.cuda.is_available():
+                        torch.cuda.empty_cache()
+                    gc.collect()
+                except Exception:
+                    pass
+                responses.extend(self._generate_mock_response(em) for em in chunk)
+                continue
+            except Exception as e:
+                print(f"❗ Błąd podczas generowania paczki: {e}")
+                responses.extend(self._generate_mock_response(em) for em in chunk)
+                continue
+            
+            prompt_len = inputs.input_ids.shape[1]
+            responses.extend(
+                text.strip() for text in self.tokenizer.batch_decode(outputs[:, prompt_len:], skip_special_tokens=True)
+            )
+        return responses
     
     def _generate_mock_response(self, email_content: Dict) -> str:
         """Generuje przykładową odpowiedź gdy model nie jest dostępny"""
@@ -647,6 +728,7 @@ Jeśli potrzebujesz dodatkowych informacji, proszę daj mi znać.
         
         processed = 0
         drafts_created = 0
+        to_answer: List[Dict] = []
         
         for idx, email_id in enumerate(email_ids, 1):
             print(f"\n--- Email {idx}/{len(email_ids)} ---")
@@ -684,12 +766,16 @@ Jeśli potrzebujesz dodatkowych informacji, proszę daj mi znać.
                 print("⏭️ Pomijam (automatyczna odpowiedź)")
                 continue
             
-            # Generuj odpowiedź
-            print("🤖 Generuję odpowiedź...")
-            response = self.generate_response_with_llm(email_content)
-            
+            to_answer.append(email_content)
+        
+        # Generuj odpowiedzi paczkami (jedno model.generate() na RESPONSE_BATCH_SIZE emaili)
+        if to_answer:
+            print(f"\n🤖 Generuję {len(to_answer)} odpowiedzi (paczki po {self.response_batch_size})...")
+        responses = self.generate_responses_batch(to_answer)
+        
+        for email_content, response in zip(to_answer, responses):
             if response:
-                print("\n📝 Wygenerowana odpowiedź:")
+                print(f"\n📝 Wygenerowana odpowiedź na: {email_content.get('subject', 'Brak tematu')[:50]}")
                 print("-" * 50)
                 print(response[:500] + ("..." if len(response) > 500 else ""))
                 print("-" * 50)
@@ -739,10 +825,17 @@ Jeśli potrzebujesz dodatkowych informacji, proszę daj mi znać.
             self.imap.logout()
             print("👋 Rozłączono z serwerem")
 
-def main():
+# Wartości domyślne opcji run() - te same co w parserze main()
+_RUN_DEFAULTS = {
+    'email': None, 'password': None, 'server': None, 'smtp': None,
+    'model': None, 'offline': False, 'folder': 'INBOX', 'limit': None,
+    'since_days': None, 'since_date': None, 'all_emails': False, 'dry_run': False,
+    'temperature': None, 'max_tokens': None,
+}
+
+
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(description='Email Responder Bot z LLM')
-    # Załaduj zmienne z .env, aby były dostępne jako domyślne
-    load_dotenv()
     parser.add_argument('--email', required=False, default=None, help='Adres email')
     parser.add_argument('--password', required=False, default=None, help='Hasło do skrzynki')
     parser.add_argument('--server', required=False, default=None, help='Serwer IMAP (opcjonalnie)')
@@ -774,7 +867,15 @@ def main():
     parser.add_argument('--max-tokens', type=int, default=None,
                        help='Maksymalna długość odpowiedzi')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    run(vars(args))
+
+
+def run(config: Dict):
+    """Uruchamia respondera dla słownika opcji (klucze jak atrybuty argparse), bez ponownego parsowania argv."""
+    args = argparse.Namespace(**{**_RUN_DEFAULTS, **config})
+    # Załaduj zmienne z .env, aby były dostępne jako domyślne
+    load_dotenv()
 
     # Fallback do zmiennych środowiskowych (wczytanych z .env), jeśli brak parametrów
     args.email = args.email or os.getenv('EMAIL_ADDRESS')
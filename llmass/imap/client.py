@@ -38,6 +38,9 @@ class ImapClient:
     def safe_expunge(self):
         return self._retry(self.session.expunge)
 
+    def safe_status(self, mailbox: str, names: str = '(MESSAGES)'):
+        return self._retry(self.session.status, mailbox, names)
+
     def safe_uid(self, command: str, *args):
         return self._retry(self.session.uid, command, *args)
 
@@ -50,6 +53,9 @@ class ImapClient:
     def safe_list(self, directory: str = "", pattern: str = "*"):
         return self._retry(self.session.list, directory, pattern)
 
+    def safe_lsub(self, directory: str = "", pattern: str = "*"):
+        return self._retry(self.session.lsub, directory, pattern)
+
     def safe_capability(self):
         return self._retry(self.session.capability)
 
@@ -73,3 +79,7 @@ class ImapClient:
 
     def safe_store(self, message_set: str, command: str, flags: str):
         return self._retry(self.session.store, message_set, command, flags)
+
+    def safe_move(self, message_set: str, mailbox: str):
+        return self._retry(self.session.move, message_set, mailbox)
+
@@ -0,0 +1,83 @@
+from __future__ import annotations
+from typing import List, Optional, Sequence
+import asyncio
+import re
+
+# Opcjonalna zależność (pip install aioimaplib)
+try:
+    import aioimaplib
+    AIOIMAPLIB_AVAILABLE = True
+except ImportError:
+    aioimaplib = None
+    AIOIMAPLIB_AVAILABLE = False
+
+
+_LITERAL_RE = re.compile(rb'\{\d+\}$')
+_FETCH_PREFIX_RE = re.compile(rb'^(\d+) FETCH ', re.IGNORECASE)
+
+
+def _to_imaplib_data(lines) -> list:
+    """Converts aioimaplib response lines to imaplib's FETCH data layout:
+    (header, literal) tuples for literals and plain bytes otherwise, with the
+    untagged 'N FETCH (' prefix reduced to imaplib's 'N ('."""
+    data = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        line = bytes(line) if isinstance(line, (bytes, bytearray)) else str(line).encode()
+        line = _FETCH_PREFIX_RE.sub(rb'\1 ', line)
+        if _LITERAL_RE.search(line) and i + 1 < len(lines):
+            data.append((line, bytes(lines[i + 1])))
+            i += 2
+            continue
+        data.append(line)
+        i += 1
+    return data
+
+
+async def _fetch_all(server: str, user: str, password: str, folder: str, uid_sets: Sequence[str],
+                     parts: str, connections: int, ssl: bool, timeout: float) -> List[Optional[list]]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, uid_set in enumerate(uid_sets):
+        queue.put_nowait((i, uid_set))
+    results: List[Optional[list]] = [None] * len(uid_sets)
+
+    async def worker():
+        if ssl:
+            client = aioimaplib.IMAP4_SSL(host=server, timeout=timeout)
+        else:
+            client = aioimaplib.IMAP4(host=server, timeout=timeout)
+        await client.wait_hello_from_server()
+        await client.login(user, password)
+        try:
+            await client.examine(folder)
+            while True:
+                try:
+                    i, uid_set = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                resp = await client.uid('fetch', uid_set, parts)
+                if resp.result == 'OK':
+                    results[i] = _to_imaplib_data(resp.lines)
+        finally:
+            try:
+                await client.logout()
+            except Exception:
+                pass
+
+    n = max(1, min(int(connections), len(uid_sets)))
+    await asyncio.gather(*[worker() for _ in range(n)], return_exceptions=True)
+    return results
+
+
+def fetch_uid_sets(server: str, user: str, password: str, folder: str, uid_sets: Sequence[str], parts: str,
+                   connections: int = 4, ssl: bool = True, timeout: float = 30.0) -> List[Optional[list]]:
+    """Fetches several UID sets concurrently over `connections` aioimaplib sessions.
+
+    Returns one imaplib-style data list per UID set (None when that FETCH failed),
+    so callers can reuse their imaplib response parsing. aioimaplib serializes
+    FETCHes on a single connection, hence the concurrency comes from the pool.
+    """
+    if not AIOIMAPLIB_AVAILABLE or not uid_sets:
+        return [None] * len(uid_sets)
+    return asyncio.run(_fetch_all(server, user, password, folder, uid_sets, parts, connections, ssl, timeout))
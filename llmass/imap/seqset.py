@@ -0,0 +1,31 @@
+from typing import Iterable, Union
+
+
+def to_sequence_set(ids: Iterable[Union[bytes, str, int]]) -> str:
+    """Builds a compact IMAP sequence-set from message numbers or UIDs.
+
+    Sorts and de-duplicates the ids and collapses consecutive runs into ranges,
+    e.g. [1, 2, 3, 5, 7, 8] -> '1:3,5,7:8'. Non-numeric ids are kept as-is.
+    """
+    nums = set()
+    other = []
+    for i in ids:
+        s = i.decode() if isinstance(i, (bytes, bytearray)) else str(i)
+        if s.isdigit():
+            nums.add(int(s))
+        else:
+            other.append(s)
+
+    parts = []
+    start = prev = None
+    for n in sorted(nums):
+        if start is None:
+            start = prev = n
+        elif n == prev + 1:
+            prev = n
+        else:
+            parts.append(f"{start}:{prev}" if prev != start else str(start))
+            start = prev = n
+    if start is not None:
+        parts.append(f"{start}:{prev}" if prev != start else str(start))
+    return ','.join(parts + other)
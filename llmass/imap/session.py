@@ -37,6 +37,10 @@ class ImapSession:
         return self.conn.close()
 
     # Basic passthroughs
+    def noop(self):
+        assert self.conn is not None
+        return self.conn.noop()
+
     def capability(self):
         assert self.conn is not None
         return self.conn.capability()
@@ -45,6 +49,10 @@ class ImapSession:
         assert self.conn is not None
         return self.conn.list(directory, pattern)
 
+    def lsub(self, directory: str = "", pattern: str = "*"):
+        assert self.conn is not None
+        return self.conn.lsub(directory, pattern)
+
     def select(self, mailbox: str = 'INBOX', readonly: bool = False):
         assert self.conn is not None
         return self.conn.select(mailbox, readonly=readonly)
@@ -53,6 +61,10 @@ class ImapSession:
         assert self.conn is not None
         return self.conn.expunge()
 
+    def status(self, mailbox: str, names: str):
+        assert self.conn is not None
+        return self.conn.status(mailbox, names)
+
     # UID/SEQ
     def uid(self, command: str, *args):
         assert self.conn is not None
@@ -75,6 +87,12 @@ class ImapSession:
         assert self.conn is not None
         return self.conn.store(message_set, command, flags)
 
+    def move(self, message_set: str, mailbox: str):
+        """MOVE (RFC 6851) by sequence numbers; imaplib only exposes it via uid()."""
+        assert self.conn is not None
+        typ, dat = self.conn._simple_command('MOVE', message_set, mailbox)
+        return self.conn._untagged_response(typ, dat, 'MOVE')
+
     # Mailbox management
     def create(self, mailbox: str):
         assert self.conn is not None
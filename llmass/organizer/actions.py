@@ -1,6 +1,21 @@
 from typing import Union
 
 
+def supports_move(ctx) -> bool:
+    """Returns True if the server advertises MOVE (RFC 6851); cached on ctx.has_move."""
+    cached = getattr(ctx, 'has_move', None)
+    if cached is not None:
+        return bool(cached)
+    client = getattr(ctx, 'client', None)
+    try:
+        _typ, caps = client.safe_capability() if client else ctx.imap.capability()
+        caps_joined = b" ".join(c if isinstance(c, (bytes, bytearray)) else str(c).encode() for c in caps or [])
+    except Exception:
+        return False
+    ctx.has_move = b"MOVE" in caps_joined.upper().split()
+    return ctx.has_move
+
+
 def move_email(ctx, email_id: Union[str, bytes], target_folder: str) -> bool:
     """
     Moves a message by UID to target_folder using MOVE if supported, otherwise COPY+STORE.
@@ -15,15 +30,9 @@ def move_email(ctx, email_id: Union[str, bytes], target_folder: str) -> bool:
         uid_str = email_id.decode() if isinstance(email_id, (bytes, bytearray)) else str(email_id)
         mailbox = ctx._encode_mailbox(target_folder) if hasattr(ctx, '_encode_mailbox') else target_folder
 
-        # Check MOVE capability
+        # MOVE capability (sprawdzana raz na połączenie)
         client = getattr(ctx, 'client', None)
-        try:
-            cap_typ, caps = client.safe_capability() if client else ctx.imap.capability()
-            caps_joined = b" ".join(caps) if caps else b""
-        except Exception:
-            caps_joined = b""
-
-        if b"MOVE" in caps_joined:
+        if supports_move(ctx):
             if getattr(ctx, 'verbose', False):
                 print(f"➡️  Używam IMAP MOVE do: {target_folder}")
             typ, resp = client.safe_uid('MOVE', uid_str, mailbox) if client else ctx.imap.uid('MOVE', uid_str, mailbox)
@@ -3,6 +3,8 @@ from collections import defaultdict
 from datetime import datetime
 from sklearn.metrics.pairwise import cosine_similarity
 
+from llmass.organizer.text_utils import fit_transform_cached
+
 
 def generate_category_name(emails: List[Dict]) -> str:
     """Generuje nazwę kategorii na podstawie emaili."""
@@ -18,6 +20,28 @@ def generate_category_name(emails: List[Dict]) -> str:
     return f"Category_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
 
+def _vectorize(ctx, texts: List[str]):
+    """Wektoryzuje teksty reużywając słownika TF-IDF z ctx.vectorizer.
+    Słownik jest dopasowywany (fit) przy pierwszym wywołaniu, co ctx.refit_every wywołań
+    oraz gdy nie pokrywa nowego korpusu (któryś tekst daje wektor zerowy);
+    dopasowanie do identycznego korpusu i konfiguracji pochodzi z cache (fit_transform_cached).
+    """
+    vec = getattr(ctx, 'vectorizer', None)
+    calls = int(getattr(ctx, '_vectorizer_calls', 0) or 0)
+    refit_every = int(getattr(ctx, 'refit_every', 0) or 0)
+    fitted = vec is not None and hasattr(vec, 'vocabulary_')
+    if fitted and not (refit_every > 0 and calls >= refit_every):
+        matrix = vec.transform(texts)
+        # Słowa spoza słownika poprzedniego korpusu dają zerowe wiersze, które nigdy nie utworzą klastra
+        if matrix.getnnz(axis=1).all():
+            ctx._vectorizer_calls = calls + 1
+            return matrix
+    vec, matrix = fit_transform_cached(ctx, texts)
+    ctx.vectorizer = vec
+    ctx._vectorizer_calls = 1
+    return matrix
+
+
 def categorize_emails(ctx, emails: List[Dict]) -> Dict[str, List[int]]:
     """Kategoryzuje emaile używając wektoryzacji i podobieństwa kosinusowego."""
     if not emails:
@@ -26,9 +50,7 @@ def categorize_emails(ctx, emails: List[Dict]) -> Dict[str, List[int]]:
     texts = [f"{e.get('subject', '')} {e.get('body', '')}" for e in emails]
 
     try:
-        # Use existing vectorizer or create one
-        vec = getattr(ctx, 'vectorizer', None) or ctx._make_vectorizer()
-        tfidf_matrix = vec.fit_transform(texts)
+        tfidf_matrix = _vectorize(ctx, texts)
         similarities = cosine_similarity(tfidf_matrix)
 
         categories: Dict[str, List[int]] = defaultdict(list)
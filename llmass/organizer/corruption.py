@@ -1,4 +1,93 @@
-from typing import List
+import re
+from typing import List, Optional, Set
+
+from llmass.imap.seqset import to_sequence_set
+
+
+_UID_RE = re.compile(rb'UID\s+(\d+)', re.IGNORECASE)
+# Mały fragment nagłówka wymusza odczyt wiadomości przez serwer (samo (UID) czyta tylko indeks)
+_PROBE_PARTS = '(UID BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])'
+
+
+def _probe_batch(ctx, test_ids: List[bytes]) -> Optional[Set[bytes]]:
+    """Pobiera wszystkie próbki jednym UID FETCH; zwraca zbiór UID z odpowiedzi lub None przy błędzie."""
+    try:
+        client = getattr(ctx, 'client', None)
+        uid_set = to_sequence_set(test_ids)
+        if client:
+            result, data = client.safe_uid('FETCH', uid_set, _PROBE_PARTS)
+        else:
+            result, data = ctx.imap.uid('FETCH', uid_set, _PROBE_PARTS)
+    except Exception as e:
+        if getattr(ctx, 'verbose', False):
+            print(f"🔍 Corruption test (batch) -> Exception: {e}")
+        return None
+    if getattr(ctx, 'verbose', False):
+        print(f"🔍 Corruption test (batch {uid_set}): result='{result}'")
+    if result != 'OK' or not data:
+        return None
+    returned: Set[bytes] = set()
+    for item in data:
+        head = item[0] if isinstance(item, tuple) else item
+        if isinstance(head, (bytes, bytearray)):
+            m = _UID_RE.search(head)
+            if m:
+                returned.add(m.group(1))
+    return returned
+
+
+def _probe_uid(ctx, test_id: bytes) -> bool:
+    """Sprawdza pojedynczy UID; zwraca True, jeśli wygląda na uszkodzony."""
+    try:
+        client = getattr(ctx, 'client', None)
+        if client:
+            result, test_data = client.safe_uid('FETCH', test_id, _PROBE_PARTS)
+        else:
+            result, test_data = ctx.imap.uid('FETCH', test_id, _PROBE_PARTS)
+        if getattr(ctx, 'verbose', False):
+            print(f"🔍 Corruption test: UID {test_id} -> result='{result}', data={test_data}, type={type(test_data)}")
+
+        is_corrupted = False
+        if result != 'OK':
+            is_corrupted = True
+            if getattr(ctx, 'verbose', False):
+                print(f"   ❌ result != OK: {result}")
+            else:
+                print(f"❌ Corruption UID {test_id}: result={result}")
+        elif not test_data:
+            is_corrupted = True
+            if getattr(ctx, 'verbose', False):
+                print(f"   ❌ not test_data: {test_data}")
+            else:
+                print(f"❌ Corruption UID {test_id}: empty data")
+        elif test_data == [None]:
+            is_corrupted = True
+            if getattr(ctx, 'verbose', False):
+                print(f"   ❌ test_data == [None]: {test_data}")
+            else:
+                print(f"❌ Corruption UID {test_id}: data=[None]")
+        elif test_data and len(test_data) > 0 and test_data[0] is None:
+            is_corrupted = True
+            if getattr(ctx, 'verbose', False):
+                print(f"   ❌ test_data[0] is None: {test_data[0]}")
+            else:
+                print(f"❌ Corruption UID {test_id}: first element None")
+        else:
+            if getattr(ctx, 'verbose', False):
+                print("   ✅ UID seems OK")
+
+        return is_corrupted
+
+    except Exception as e:
+        if getattr(ctx, 'verbose', False):
+            print(f"🔍 Corruption test: UID {test_id} -> Exception: {e}")
+        else:
+            # Use ctx._short if available
+            if hasattr(ctx, '_short'):
+                print(f"❌ Corruption UID {test_id}: Exception {ctx._short(e)}")
+            else:
+                print(f"❌ Corruption UID {test_id}: Exception {e}")
+        return True
 
 
 def check_and_handle_corruption(ctx, email_ids: List[bytes]) -> float:
@@ -6,7 +95,8 @@ def check_and_handle_corruption(ctx, email_ids: List[bytes]) -> float:
     Checks UID corruption using the first up-to-10 IDs and, if needed, flips
     ctx.use_sequence_numbers to True. Returns the computed corruption ratio.
 
-    - Uses ctx.client.safe_uid('FETCH', uid, '(RFC822)') when available to probe
+    - Probes all ids with one UID FETCH of a tiny header field; falls back to
+      per-UID probes when the batched FETCH fails
     - Respects ctx.verbose for detailed prints
     - Prints critical warnings regardless of verbosity (treated as errors)
     """
@@ -19,58 +109,22 @@ def check_and_handle_corruption(ctx, email_ids: List[bytes]) -> float:
     test_ids = email_ids[:10]
     corruption_count = 0
 
-    for test_id in test_ids:
-        try:
-            client = getattr(ctx, 'client', None)
-            if client:
-                result, test_data = client.safe_uid('FETCH', test_id, '(RFC822)')
-            else:
-                result, test_data = ctx.imap.uid('FETCH', test_id, '(RFC822)')
-            if getattr(ctx, 'verbose', False):
-                print(f"🔍 Corruption test: UID {test_id} -> result='{result}', data={test_data}, type={type(test_data)}")
-
-            is_corrupted = False
-            if result != 'OK':
-                is_corrupted = True
-                if getattr(ctx, 'verbose', False):
-                    print(f"   ❌ result != OK: {result}")
-                else:
-                    print(f"❌ Corruption UID {test_id}: result={result}")
-            elif not test_data:
-                is_corrupted = True
-                if getattr(ctx, 'verbose', False):
-                    print(f"   ❌ not test_data: {test_data}")
-                else:
-                    print(f"❌ Corruption UID {test_id}: empty data")
-            elif test_data == [None]:
-                is_corrupted = True
-                if getattr(ctx, 'verbose', False):
-                    print(f"   ❌ test_data == [None]: {test_data}")
-                else:
-                    print(f"❌ Corruption UID {test_id}: data=[None]")
-            elif test_data and len(test_data) > 0 and test_data[0] is None:
-                is_corrupted = True
-                if getattr(ctx, 'verbose', False):
-                    print(f"   ❌ test_data[0] is None: {test_data[0]}")
-                else:
-                    print(f"❌ Corruption UID {test_id}: first element None")
-            else:
-                if getattr(ctx, 'verbose', False):
-                    print("   ✅ UID seems OK")
-
-            if is_corrupted:
-                corruption_count += 1
-
-        except Exception as e:
+    # Jeden UID FETCH dla wszystkich próbek; brakujące w odpowiedzi UID uznajemy za uszkodzone
+    returned = _probe_batch(ctx, test_ids)
+    if returned is not None:
+        for test_id in test_ids:
+            tid = test_id if isinstance(test_id, (bytes, bytearray)) else str(test_id).encode()
+            if tid in returned:
+                continue
             corruption_count += 1
             if getattr(ctx, 'verbose', False):
-                print(f"🔍 Corruption test: UID {test_id} -> Exception: {e}")
+                print(f"🔍 Corruption test: UID {test_id} -> brak w odpowiedzi FETCH")
             else:
-                # Use ctx._short if available
-                if hasattr(ctx, '_short'):
-                    print(f"❌ Corruption UID {test_id}: Exception {ctx._short(e)}")
-                else:
-                    print(f"❌ Corruption UID {test_id}: Exception {e}")
+                print(f"❌ Corruption UID {test_id}: missing from FETCH response")
+    else:
+        for test_id in test_ids:
+            if _probe_uid(ctx, test_id):
+                corruption_count += 1
 
     ratio = corruption_count / len(test_ids) if test_ids else 0.0
     if getattr(ctx, 'verbose', False):
@@ -1,5 +1,205 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import email
+import re
+
+from llmass.imap.pipeline import AIOIMAPLIB_AVAILABLE, fetch_uid_sets
+from llmass.imap.seqset import to_sequence_set
+
+# Opcjonalny parser MIME w Rust (pip install fast_mail_parser)
+try:
+    import fast_mail_parser
+    FAST_MAIL_PARSER_AVAILABLE = True
+except ImportError:
+    fast_mail_parser = None
+    FAST_MAIL_PARSER_AVAILABLE = False
+
+
+_UID_RE = re.compile(rb'UID\s+(\d+)', re.IGNORECASE)
+_MSG_START_RE = re.compile(rb'^\s*(\d+)\s+\(')
+
+# Nagłówki potrzebne filtrom i kategoryzacji + nagłówki MIME do zdekodowania treści
+_HEADER_FIELDS = 'SUBJECT FROM DATE MESSAGE-ID IN-REPLY-TO REFERENCES MIME-VERSION CONTENT-TYPE CONTENT-TRANSFER-ENCODING'
+
+
+def _fetch_parts(ctx) -> str:
+    """Zwraca listę elementów FETCH: wybrane nagłówki + początek treści (bez załączników)."""
+    body_bytes = int(getattr(ctx, 'fetch_body_bytes', 8192) or 0)
+    text = f"BODY.PEEK[TEXT]<0.{body_bytes}>" if body_bytes > 0 else "BODY.PEEK[TEXT]"
+    return f"(BODY.PEEK[HEADER.FIELDS ({_HEADER_FIELDS})] {text})"
+
+
+def _iter_fetch_response(data, use_seq: bool, keys: List[bytes]) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    Walks a flat imaplib FETCH response and yields (uid_or_seq, raw_bytes) as
+    soon as each message is complete. Each message starts with a tuple whose
+    header begins with the SEQ number; further literals (e.g. BODY[TEXT])
+    follow as tuples and the UID may appear in any header or trailing bytes
+    element. The header literal and the text literal are joined into one
+    RFC822 blob.
+    """
+    def finish(msg):
+        key = msg['seq'] if use_seq else msg['uid']
+        if key is None and len(keys) == 1:
+            key = keys[0]
+        if key is not None:
+            return key, msg['header'] + msg['text']
+        return None
+
+    cur = None
+    for item in data or []:
+        if isinstance(item, tuple) and len(item) >= 2:
+            head = item[0] if isinstance(item[0], (bytes, bytearray)) else str(item[0]).encode()
+            m = _MSG_START_RE.match(head)
+            if m:
+                done = finish(cur) if cur is not None else None
+                if done:
+                    yield done
+                cur = {'seq': m.group(1), 'uid': None, 'header': b'', 'text': b''}
+            if cur is None:
+                continue
+            u = _UID_RE.search(head)
+            if u:
+                cur['uid'] = u.group(1)
+            literal = item[1] or b''
+            if b'HEADER' in head.upper():
+                cur['header'] = literal
+            else:
+                cur['text'] = literal
+        elif isinstance(item, (bytes, bytearray)) and cur is not None:
+            if _MSG_START_RE.match(item):
+                # Niezamówiony FETCH (np. '9 (UID 40 FLAGS (\\Seen))') - zamyka bieżącą wiadomość, jego UID nie należy do niej
+                done = finish(cur)
+                if done:
+                    yield done
+                cur = None
+                continue
+            u = _UID_RE.search(item)
+            if u:
+                cur['uid'] = u.group(1)
+    done = finish(cur) if cur is not None else None
+    if done:
+        yield done
+
+
+def _parse_fetch_response(data, use_seq: bool, keys: List[bytes]) -> Dict[bytes, bytes]:
+    """Returns {uid_or_seq: raw_bytes} for a whole FETCH response (see _iter_fetch_response)."""
+    return dict(_iter_fetch_response(data, use_seq, keys))
+
+
+def _fetch_batch(ctx, keys: List[bytes], use_seq: bool) -> Dict[bytes, bytes]:
+    """
+    Fetches a batch of messages with a single (UID) FETCH and returns a mapping
+    {uid_or_seq: raw_bytes}. Only the needed headers and the first
+    ctx.fetch_body_bytes of the text are transferred.
+    """
+    client = getattr(ctx, 'client', None)
+    parts = _fetch_parts(ctx)
+    msg_set = to_sequence_set(keys)
+    if use_seq:
+        result, data = client.safe_fetch(msg_set, parts) if client else ctx.imap.fetch(msg_set, parts)
+    else:
+        result, data = client.safe_uid('FETCH', msg_set, parts) if client else ctx.imap.uid('FETCH', msg_set, parts)
+    if result != 'OK' or not data:
+        if getattr(ctx, 'verbose', False):
+            print(f"\n❌ FETCH batch failed - result='{result}', data={data}")
+        return {}
+    return _parse_fetch_response(data, use_seq, keys)
+
+
+def _prefetch_async(ctx, email_ids: List[bytes]) -> Dict[bytes, bytes]:
+    """
+    Prefetches messages concurrently over ctx.async_fetch_connections extra
+    IMAP sessions (aioimaplib), in UID sets of ctx.async_fetch_batch_size.
+    Returns {uid: raw_bytes}; anything missing is fetched synchronously later.
+    """
+    if not AIOIMAPLIB_AVAILABLE or not email_ids:
+        return {}
+    keys = [e if isinstance(e, (bytes, bytearray)) else str(e).encode() for e in email_ids]
+    sub = max(1, int(getattr(ctx, 'async_fetch_batch_size', 20) or 20))
+    key_sets = [keys[i:i + sub] for i in range(0, len(keys), sub)]
+    try:
+        results = fetch_uid_sets(
+            ctx.imap_server,
+            ctx.email_address,
+            ctx.password,
+            getattr(ctx, 'current_folder', None) or 'INBOX',
+            [to_sequence_set(ks) for ks in key_sets],
+            _fetch_parts(ctx),
+            connections=int(getattr(ctx, 'async_fetch_connections', 4) or 4),
+            ssl=bool(getattr(getattr(ctx, 'imap', None), 'ssl', True)),
+        )
+    except Exception as e:
+        if hasattr(ctx, 'logger'):
+            try:
+                ctx.logger.debug(f"Asynchroniczny FETCH nie powiódł się: {e}")
+            except Exception:
+                pass
+        return {}
+    raw_by_key: Dict[bytes, bytes] = {}
+    for ks, data in zip(key_sets, results):
+        if data:
+            raw_by_key.update(_parse_fetch_response(data, False, ks))
+    return raw_by_key
+
+
+def _header_value(headers: Dict, name: str) -> str:
+    """Zwraca pierwszą wartość nagłówka z dict fast_mail_parser (bez względu na wielkość liter)."""
+    lname = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lname:
+            if isinstance(value, (list, tuple)):
+                return value[0] if value else ''
+            return value or ''
+    return ''
+
+
+def _parse_message(ctx, raw_email: bytes) -> Dict:
+    """Parsuje surową wiadomość do dict treści; fast_mail_parser z fallbackiem na stdlib."""
+    if FAST_MAIL_PARSER_AVAILABLE:
+        try:
+            parsed = fast_mail_parser.parse_email(raw_email)
+            # Bez części text/plain (np. jednoczęściowy text/html) treść daje tylko stdlib - inaczej filtry widziałyby ''
+            if not parsed.text_plain:
+                raise ValueError("no text/plain part")
+            headers = parsed.headers or {}
+            return {
+                'subject': parsed.subject or '',
+                'from': _header_value(headers, 'From'),
+                'body': parsed.text_plain[0],
+                'date': _header_value(headers, 'Date'),
+                'message_id': _header_value(headers, 'Message-ID'),
+                'in_reply_to': _header_value(headers, 'In-Reply-To'),
+                'references': _header_value(headers, 'References'),
+            }
+        except Exception:
+            pass
+    msg = email.message_from_bytes(raw_email)
+    return ctx.get_email_content(msg)
+
+
+def _parse_and_check(ctx, raw_email: bytes) -> Optional[Tuple[Dict, bool]]:
+    """Parsuje wiadomość i sprawdza SPAM (zadanie dla puli wątków); None przy błędzie."""
+    try:
+        content = _parse_message(ctx, raw_email)
+        return content, bool(ctx.is_spam(content))
+    except Exception as e:
+        if hasattr(ctx, 'logger'):
+            try:
+                ctx.logger.debug(f"Błąd parsowania wiadomości: {e}")
+            except Exception:
+                pass
+        return None
+
+
+def _has_min_words(subject: str, body: str, min_tokens: int) -> bool:
+    """Sprawdza, czy temat+treść mają min_tokens słów, dzieląc tekst tylko do osiągnięcia progu."""
+    if min_tokens <= 0:
+        return True
+    n = len(subject.split(None, min_tokens - 1))
+    if n >= min_tokens:
+        return True
+    return n + len(body.split(None, min_tokens - n - 1)) >= min_tokens
 
 
 def fetch_and_filter(ctx, email_ids: List[bytes], limit: int, sent_drafts_ids: set) -> Tuple[List[Dict], Dict[str, int]]:
@@ -7,6 +207,11 @@ def fetch_and_filter(ctx, email_ids: List[bytes], limit: int, sent_drafts_ids: s
     Fetches emails (UID or SEQ depending on ctx.use_sequence_numbers), parses
     content, and applies filters (spam, short content, active conversation).
 
+    Messages are fetched in batches of ctx.fetch_batch_size (default 100) so a
+    single IMAP round-trip covers the whole batch. Only selected headers and
+    the first ctx.fetch_body_bytes (default 8192) of the text are downloaded.
+    With ctx.async_fetch the batches are prefetched concurrently (aioimaplib).
+
     Returns (emails_data, stats) where stats contains counts for reporting:
       - scanned, spam, short, active_conv, skipped_low_text
     """
@@ -18,104 +223,147 @@ def fetch_and_filter(ctx, email_ids: List[bytes], limit: int, sent_drafts_ids: s
 
     processed_count = 0
     target_count = int(limit) if limit is not None else len(email_ids)
+    batch_size = max(1, int(getattr(ctx, 'fetch_batch_size', 100) or 100))
+    use_seq = bool(getattr(ctx, 'use_sequence_numbers', False))
+    verbose = getattr(ctx, 'verbose', False)
+    short = getattr(ctx, '_short', lambda x: str(x))
 
-    for idx, email_id in enumerate(email_ids, 1):
-        if processed_count >= target_count:
-            break
+    prefetched: Dict[bytes, bytes] = {}
+    if getattr(ctx, 'async_fetch', False) and not use_seq:
+        prefetched = _prefetch_async(ctx, email_ids[:target_count])
 
-        if getattr(ctx, 'verbose', False):
-            print(
-                f"Analizuję email {idx}/{len(email_ids)} (przetworzono: {processed_count}/{target_count})...",
-                end='\r'
-            )
+    def batch_keys(start_idx: int, batch: List[bytes]) -> List[bytes]:
+        # Klucze FETCH: SEQ (najnowsze pierwsze) albo UID
+        if use_seq:
+            return [str(len(email_ids) - idx + 1).encode() for idx in range(start_idx, start_idx + len(batch))]
+        return [e if isinstance(e, (bytes, bytearray)) else str(e).encode() for e in batch]
 
-        try:
-            # Fetch message (SEQ or UID)
-            client = getattr(ctx, 'client', None)
-            if getattr(ctx, 'use_sequence_numbers', False):
-                seq_num = str(len(email_ids) - idx + 1)  # newest first
-                result, data = client.safe_fetch(seq_num, '(RFC822)') if client else ctx.imap.fetch(seq_num, '(RFC822)')
-                if getattr(ctx, 'verbose', False) and idx <= 5:
-                    print(f"\n🔧 Email {idx}: Tryb sekwencyjny, używam SEQ={seq_num}")
-            else:
-                result, data = client.safe_uid('FETCH', email_id, '(RFC822)') if client else ctx.imap.uid('FETCH', email_id, '(RFC822)')
-                if getattr(ctx, 'verbose', False) and idx <= 5:
-                    print(f"\n🔍 Email {idx}: Tryb UID, używam UID={email_id}")
-
-            if result != 'OK' or not data or not data[0]:
-                if getattr(ctx, 'verbose', False):
-                    if idx <= 5:
-                        print(f"\n❌ Email {idx}: FETCH failed - result='{result}', data={data}, type={type(data)}")
-                        if data and len(data) > 0:
-                            print(f"   data[0]={data[0]}, type={type(data[0])}")
-                        print(f"   result != 'OK': {result != 'OK'}")
-                        print(f"   not data: {not data}")
-                        print(f"   not data[0]: {not data[0] if data else 'N/A'}")
-                        print(f"   data == [None]: {data == [None]}")
-                else:
-                    short = getattr(ctx, '_short', lambda x: str(x))
+    # PARSE_WORKERS > 0: następny batch pobierany w tle podczas parsowania bieżącego w puli wątków
+    parse_workers = int(getattr(ctx, 'parse_workers', 0) or 0)
+    fetch_pool = ThreadPoolExecutor(max_workers=1) if parse_workers > 0 else None
+    parse_pool = ThreadPoolExecutor(max_workers=parse_workers) if parse_workers > 0 else None
+    pending = None
+
+    try:
+        pos = 0
+        while pos < len(email_ids) and processed_count < target_count:
+            batch = email_ids[pos:pos + min(batch_size, target_count - processed_count)]
+            start_idx = pos + 1
+            pos += len(batch)
+            keys = batch_keys(start_idx, batch)
+            if verbose and start_idx <= 5:
+                mode = "SEQ" if use_seq else "UID"
+                print(f"\n🔍 Batch FETCH ({mode}): {len(keys)} emaili od #{start_idx}")
+
+            if pending is not None:
+                try:
+                    prefetched.update(pending.result())
+                except Exception:
+                    pass
+                pending = None
+            raw_by_key = {k: prefetched.pop(k) for k in keys if k in prefetched}
+            missing = [k for k in keys if k not in raw_by_key]
+            try:
+                if missing:
+                    raw_by_key.update(_fetch_batch(ctx, missing, use_seq))
+            except Exception as e:
+                if hasattr(ctx, 'logger'):
+                    try:
+                        ctx.logger.debug(f"Błąd podczas pobierania batcha od {batch[0]}: {e}")
+                    except Exception:
+                        pass
+                if not raw_by_key:
+                    continue
+
+            # Spekulatywnie pobierz kolejny batch (rozmiar jak gdyby cały bieżący przeszedł)
+            if fetch_pool is not None:
+                next_size = min(batch_size, target_count - processed_count - len(batch))
+                if next_size > 0 and pos < len(email_ids):
+                    next_keys = batch_keys(pos + 1, email_ids[pos:pos + next_size])
+                    pending = fetch_pool.submit(_fetch_batch, ctx, next_keys, use_seq)
+
+            parsed: Dict[bytes, Optional[Tuple[Dict, bool]]] = {}
+            if parse_pool is not None:
+                present = [k for k in keys if raw_by_key.get(k)]
+                parsed = dict(zip(present, parse_pool.map(lambda k: _parse_and_check(ctx, raw_by_key[k]), present)))
+
+            for offset, (email_id, key) in enumerate(zip(batch, keys)):
+                idx = start_idx + offset
+                if processed_count >= target_count:
+                    break
+
+                if verbose:
                     print(
-                        f"❌ FETCH failed for UID {short(email_id)}: result={short(result)} data={short(data)}"
+                        f"Analizuję email {idx}/{len(email_ids)} (przetworzono: {processed_count}/{target_count})...",
+                        end='\r'
                     )
-                continue
 
-            raw_email = data[0][1]
-            if not raw_email:
-                if getattr(ctx, 'verbose', False) and idx <= 5:
-                    print(f"\n❌ Email {idx}: raw_email is None/empty")
-                else:
-                    short = getattr(ctx, '_short', lambda x: str(x))
-                    print(f"❌ Empty raw email for UID {short(email_id)}")
-                continue
+                try:
+                    # pop: surowe bajty zwalniane zaraz po przetworzeniu wiadomości
+                    raw_email = raw_by_key.pop(key, None)
+                    if not raw_email:
+                        if verbose and idx <= 5:
+                            print(f"\n❌ Email {idx}: raw_email is None/empty")
+                        else:
+                            print(f"❌ Empty raw email for UID {short(email_id)}")
+                        continue
 
-            msg = email.message_from_bytes(raw_email)
-            email_content = ctx.get_email_content(msg)
-            email_content['id'] = email_id
+                    if parse_pool is not None:
+                        result = parsed.pop(key, None)
+                        if result is None:
+                            continue
+                        email_content, spam = result
+                    else:
+                        email_content = _parse_message(ctx, raw_email)
+                        spam = ctx.is_spam(email_content)
+                    email_content['id'] = email_id
 
-            processed_count += 1
+                    processed_count += 1
 
-            # Spam filter
-            if ctx.is_spam(email_content):
-                spam_ids.append(email_id)
-                continue
+                    # Spam filter
+                    if spam:
+                        spam_ids.append(email_id)
+                        continue
 
-            # Content sufficiency
-            subject = email_content.get('subject', '')
-            body = email_content.get('body', '')
-            content_length = len(subject + body)
-            word_count = len((subject + ' ' + body).split())
-            if content_length < int(ctx.content_min_chars) or word_count < int(ctx.content_min_tokens):
-                short_message_ids.append(email_id)
-                skipped_low_text += 1
-                continue
+                    # Content sufficiency
+                    subject = email_content.get('subject', '')
+                    body = email_content.get('body', '')
+                    if len(subject) + len(body) < int(ctx.content_min_chars) or not _has_min_words(subject, body, int(ctx.content_min_tokens)):
+                        short_message_ids.append(email_id)
+                        skipped_low_text += 1
+                        continue
 
-            # Active conversation filters
-            msg_id = email_content.get('message_id', '')
-            in_reply_to = email_content.get('in_reply_to', '')
-            references = email_content.get('references', '')
+                    # Active conversation filters
+                    msg_id = email_content.get('message_id', '')
+                    in_reply_to = email_content.get('in_reply_to', '')
+                    references = email_content.get('references', '')
 
-            if msg_id and msg_id in sent_drafts_ids:
-                active_conversation_count += 1
-                continue
-            if in_reply_to and in_reply_to in sent_drafts_ids:
-                active_conversation_count += 1
-                continue
-            if references:
-                ref_ids = references.split()
-                if any(ref_id in sent_drafts_ids for ref_id in ref_ids):
-                    active_conversation_count += 1
-                    continue
+                    if msg_id and msg_id in sent_drafts_ids:
+                        active_conversation_count += 1
+                        continue
+                    if in_reply_to and in_reply_to in sent_drafts_ids:
+                        active_conversation_count += 1
+                        continue
+                    if references and not sent_drafts_ids.isdisjoint(references.split()):
+                        active_conversation_count += 1
+                        continue
 
-            emails_data.append(email_content)
+                    emails_data.append(email_content)
 
-        except Exception as e:
-            # keep going, log debug if available
-            if hasattr(ctx, 'logger'):
-                try:
-                    ctx.logger.debug(f"Błąd podczas pobierania emaila {email_id}: {e}")
-                except Exception:
-                    pass
-            continue
+                except Exception as e:
+                    # keep going, log debug if available
+                    if hasattr(ctx, 'logger'):
+                        try:
+                            ctx.logger.debug(f"Błąd podczas pobierania emaila {email_id}: {e}")
+                        except Exception:
+                            pass
+                    continue
+    finally:
+        if pending is not None:
+            pending.cancel()
+        for pool in (fetch_pool, parse_pool):
+            if pool is not None:
+                pool.shutdown(wait=True)
 
     stats = {
         'scanned': len(email_ids),
@@ -1,30 +1,71 @@
 import re
+import string
+from itertools import islice
 from typing import Dict, Set, List, Tuple
 from email.utils import parseaddr
 from datetime import datetime, timedelta
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+from llmass.imap.seqset import to_sequence_set
+
+
+SPAM_PATTERNS = [
+    r'viagra|cialis|pharmacy',
+    r'winner|congratulations|you won',
+    r'click here now|act now|limited time',
+    r'100% free|risk free|satisfaction guaranteed',
+    r'make money fast|earn extra cash',
+    r'nigerian prince|inheritance|lottery',
+    r'unsubscribe|opt-out',
+    r'dear friend|dear sir/madam',
+    r'!!!|₹|\$\$\$',
+]
+# Jedna skompilowana alternacja zamiast osobnego re.search dla każdego wzorca
+_SPAM_RE = re.compile('|'.join(f'(?:{p})' for p in SPAM_PATTERNS), re.IGNORECASE)
+# Literały wzorców (wszystkie są prostymi alternatywami) do taniego odrzucenia przed regexem.
+# casefold() pokrywa IGNORECASE poza tureckim İ/ı, dla których regex uruchamiamy zawsze.
+_SPAM_LITERALS = tuple(
+    alt.replace('\\$', '$').casefold() for p in SPAM_PATTERNS for alt in p.split('|')
+)
+_IGNORECASE_EXTRA_I = ('\u0130', '\u0131')
+_WORD_CHAR_RE = re.compile(r"\w", re.UNICODE)
+_TOKEN_RE = re.compile(r"\b\w{3,}\b", re.UNICODE)
+# Message-ID szukany bezpośrednio w bajtach nagłówka (bez dekodowania)
+_MSGID_RE = re.compile(rb'Message-ID:\s*<([^>]+)>', re.IGNORECASE)
+
+
+# Bajty usuwane przez bytes.translate; różnica długości = liczba trafień (pętla w C, bez rozgałęzień w Pythonie)
+_ASCII_UPPER = string.ascii_uppercase.encode('ascii')
+_ASCII_DIGITS = string.digits.encode('ascii')
+_VOWEL_DELETE = str.maketrans('', '', 'aeiouAEIOU')
+# Podejrzane TLD sprawdzane jednym wyszukaniem w zbiorze
+_SUSPICIOUS_TLDS = frozenset({'xyz', 'top', 'club', 'work', 'click', 'link', 'pw', 'gq', 'tk', 'ml', 'info'})
+
+
+def _count_upper(s: str) -> int:
+    """Liczy wielkie litery; dla napisów ASCII przez bytes.translate."""
+    if not s.isascii():
+        return sum(1 for c in s if c.isupper())
+    b = s.encode('ascii')
+    return len(b) - len(b.translate(None, _ASCII_UPPER))
+
+
+def _count_digits(s: str) -> int:
+    """Liczy cyfry; dla napisów ASCII przez bytes.translate."""
+    if not s.isascii():
+        return sum(ch.isdigit() for ch in s)
+    b = s.encode('ascii')
+    return len(b) - len(b.translate(None, _ASCII_DIGITS))
 
 
 def is_spam(email_content: Dict) -> bool:
     """Heurystyczne wykrywanie SPAM na podstawie treści i nadawcy."""
-    spam_patterns = [
-        r'viagra|cialis|pharmacy',
-        r'winner|congratulations|you won',
-        r'click here now|act now|limited time',
-        r'100% free|risk free|satisfaction guaranteed',
-        r'make money fast|earn extra cash',
-        r'nigerian prince|inheritance|lottery',
-        r'unsubscribe|opt-out',
-        r'dear friend|dear sir/madam',
-        r'!!!|₹|\$\$\$',
-    ]
-
-    text_to_check = (email_content.get('subject', '') + ' ' + email_content.get('body', '')).lower()
-
-    # 1) Silne wzorce w treści/temacie
-    for pattern in spam_patterns:
-        if re.search(pattern, text_to_check, re.IGNORECASE):
+    text_to_check = (email_content.get('subject', '') or '') + ' ' + (email_content.get('body', '') or '')
+
+    # 1) Silne wzorce w treści/temacie (regex tylko gdy występuje któryś z literałów)
+    folded = text_to_check.casefold()
+    if any(lit in folded for lit in _SPAM_LITERALS) or any(ch in text_to_check for ch in _IGNORECASE_EXTRA_I):
+        if _SPAM_RE.search(text_to_check):
             return True
 
     score = 0
@@ -32,7 +73,7 @@ def is_spam(email_content: Dict) -> bool:
     # 2) Nadmierna ilość wielkich liter w temacie (miękka heurystyka)
     subj = email_content.get('subject', '') or ''
     if subj:
-        upper_count = sum(1 for c in subj if c.isupper())
+        upper_count = _count_upper(subj)
         if len(subj) >= 5:
             caps_ratio = upper_count / len(subj)
             if caps_ratio > 0.7:
@@ -46,21 +87,18 @@ def is_spam(email_content: Dict) -> bool:
         local = local or ''
         domain = domain.lower() or ''
 
-        # Podejrzane TLD
-        suspicious_tlds = (
-            '.xyz', '.top', '.club', '.work', '.click', '.link', '.pw', '.gq', '.tk', '.ml', '.info'
-        )
-        if any(domain.endswith(tld) for tld in suspicious_tlds):
+        # Podejrzane TLD (ostatnia etykieta domeny)
+        last_dot = domain.rfind('.')
+        if last_dot != -1 and domain[last_dot + 1:] in _SUSPICIOUS_TLDS:
             score += 1
 
         # Nadmiar cyfr w local-part
-        digits = sum(ch.isdigit() for ch in local)
+        digits = _count_digits(local)
         if len(local) >= 8 and digits / max(len(local), 1) > 0.5:
             score += 1
 
         # Długie losowe ciągi znaków (prosta heurystyka: brak samogłosek w dłuższym fragmencie)
-        vowels = set('aeiou')
-        if len(local) >= 10 and sum(ch.lower() in vowels for ch in local) <= 1:
+        if len(local) >= 10 and len(local) - len(local.translate(_VOWEL_DELETE)) <= 1:
             score += 1
 
     return score >= 2
@@ -72,13 +110,12 @@ def has_sufficient_text(email_content: Dict, min_chars: int, min_tokens: int) ->
         text = f"{email_content.get('subject','')} {email_content.get('body','')}".strip()
         if not text:
             return False
-        alnum = re.findall(r"\w", text, flags=re.UNICODE)
-        tokens = re.findall(r"\b\w{3,}\b", text, flags=re.UNICODE)
-        if len(alnum) >= int(min_chars):
-            return True
-        if len(tokens) >= int(min_tokens):
+        # Liczymy dopasowania tylko do progu; tokeny liczone dopiero, gdy znaków jest za mało
+        min_chars = int(min_chars)
+        if sum(1 for _ in islice(_WORD_CHAR_RE.finditer(text), min_chars)) >= min_chars:
             return True
-        return False
+        min_tokens = int(min_tokens)
+        return sum(1 for _ in islice(_TOKEN_RE.finditer(text), min_tokens)) >= min_tokens
     except Exception:
         return False
 
@@ -117,68 +154,91 @@ def get_sent_drafts_message_ids(ctx) -> Set[str]:
             uids = data[0].split()
             uids = uids[-per_folder_limit:]
 
-            for uid in uids:
+            # Jeden UID FETCH na paczkę (max 1000 UID w zbiorze, RFC 2683) zamiast osobnego na każdy UID
+            for i in range(0, len(uids), 1000):
+                uid_set = to_sequence_set(uids[i:i + 1000])
                 if client:
-                    res, d = client.safe_uid('FETCH', uid, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
+                    res, d = client.safe_uid('FETCH', uid_set, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
                 else:
-                    res, d = ctx.imap.uid('FETCH', uid, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
-                if res != 'OK' or not d or not d[0]:
+                    res, d = ctx.imap.uid('FETCH', uid_set, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
+                if res != 'OK' or not d:
                     continue
-                header_block = d[0][1].decode(errors='ignore') if isinstance(d[0][1], (bytes, bytearray)) else str(d[0][1])
-                m = re.search(r"Message-ID:\s*<([^>]+)>", header_block, re.IGNORECASE)
-                if m:
-                    message_ids.add(m.group(1))
+                for item in d:
+                    if not isinstance(item, tuple) or len(item) < 2:
+                        continue
+                    header_block = item[1] if isinstance(item[1], (bytes, bytearray)) else str(item[1]).encode()
+                    m = _MSGID_RE.search(header_block)
+                    if m:
+                        message_ids.add(m.group(1).decode('ascii', 'ignore'))
         except Exception:
             continue
 
     return message_ids
 
 
+def _reference_spam_matrix(ctx, spam_folder: str):
+    """Zwraca (vectorizer, ref_matrix) dla próbki SPAM/Kosz, cache'owane na ctx._spam_vec_cache.
+
+    Słownik TF-IDF jest dopasowywany tylko do tekstów referencyjnych, więc przy
+    trafieniu w cache kolejne wywołania nie pobierają ani nie tokenizują ich ponownie.
+    Klucz: (spam_folder, foldery kosza, cross_spam_sample_limit, dzień).
+    """
+    trash_folders = ctx._find_trash_folders()
+    key = (spam_folder, tuple(trash_folders), int(ctx.cross_spam_sample_limit), datetime.now().strftime('%Y-%m-%d'))
+    cache = getattr(ctx, '_spam_vec_cache', None)
+    if cache and cache[0] == key:
+        return cache[1], cache[2]
+
+    ref_texts: List[str] = []
+    if spam_folder:
+        ref_texts += ctx._fetch_texts_from_folder(spam_folder, ctx.cross_spam_sample_limit)
+    per_folder = max(1, ctx.cross_spam_sample_limit // max(1, len(trash_folders))) if trash_folders else 0
+    for tf in trash_folders:
+        ref_texts += ctx._fetch_texts_from_folder(tf, per_folder)
+
+    if not ref_texts:
+        return None, None
+
+    vec = ctx._make_vectorizer()
+    ref_matrix = vec.fit_transform(ref_texts)
+    ctx._spam_vec_cache = (key, vec, ref_matrix)
+    return vec, ref_matrix
+
+
 def mark_inbox_like_spam(ctx, emails_data: List[Dict], spam_folder: str) -> Tuple[List[bytes], List[int]]:
     """Cross-folder similarity: marks INBOX emails similar to SPAM/TRASH.
 
     Returns (uids_to_spam, indices_to_remove) for emails that should be treated as spam.
     Uses ctx helpers: _fetch_texts_from_folder, _find_trash_folders, _make_vectorizer.
     Controlled by ctx.cross_spam_sample_limit and ctx.cross_spam_similarity.
+    The reference vocabulary and matrix are reused between calls (see _reference_spam_matrix).
     """
     try:
         if not emails_data:
             return ([], [])
 
-        ref_texts: List[str] = []
-        if spam_folder:
-            ref_texts += ctx._fetch_texts_from_folder(spam_folder, ctx.cross_spam_sample_limit)
-        trash_folders = ctx._find_trash_folders()
-        per_folder = max(1, ctx.cross_spam_sample_limit // max(1, len(trash_folders))) if trash_folders else 0
-        for tf in trash_folders:
-            ref_texts += ctx._fetch_texts_from_folder(tf, per_folder)
-
-        if not ref_texts:
+        vec, ref_matrix = _reference_spam_matrix(ctx, spam_folder)
+        if vec is None:
             return ([], [])
 
         inbox_texts = [f"{e.get('subject','')} {e.get('body','')}" for e in emails_data]
-        vec = ctx._make_vectorizer()
-        all_texts = ref_texts + inbox_texts
-        tfidf = vec.fit_transform(all_texts)
-        ref_matrix = tfidf[:len(ref_texts)]
-        inbox_matrix = tfidf[len(ref_texts):]
+        inbox_matrix = vec.transform(inbox_texts)
 
-        sims = cosine_similarity(inbox_matrix, ref_matrix)
+        if ref_matrix.shape[0] == 0:
+            return ([], [])
+        # Iloczyn rzadkich macierzy znormalizowanych L2 = podobieństwo cosinusowe, bez gęstej macierzy
+        sims = normalize(inbox_matrix).tocsr() @ normalize(ref_matrix).tocsr().T
+        max_per_row = np.asarray(sims.max(axis=1).todense()).ravel()
+        thr = float(ctx.cross_spam_similarity)
         uids_to_spam: List[bytes] = []
         indices_to_remove: List[int] = []
-        thr = float(ctx.cross_spam_similarity)
-        for idx in range(sims.shape[0]):
-            if sims.shape[1] == 0:
-                break
-            max_sim = float(np.max(sims[idx]))
-            if max_sim >= thr:
-                email_id = emails_data[idx]['id']
-                uid_b = email_id if isinstance(email_id, (bytes, bytearray)) else str(email_id).encode()
-                uids_to_spam.append(uid_b)
-                indices_to_remove.append(idx)
+        for idx in np.nonzero(max_per_row >= thr)[0]:
+            idx = int(idx)
+            email_id = emails_data[idx]['id']
+            uid_b = email_id if isinstance(email_id, (bytes, bytearray)) else str(email_id).encode()
+            uids_to_spam.append(uid_b)
+            indices_to_remove.append(idx)
         return (uids_to_spam, indices_to_remove)
     except Exception as e:
         print(f"ℹ️  Błąd porównania z TRASH/SPAM: {e}")
         return ([], [])
-
-    
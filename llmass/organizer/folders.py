@@ -1,18 +1,81 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import heapq
 import re
+import threading
+import time
 import unicodedata
 import string
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 
 
+# Linia odpowiedzi LIST, np. (\HasNoChildren) "." "INBOX.Sent"; wariant z delimiterem bez cudzysłowów / NIL
+_LIST_RE = re.compile(r'\((?P<flags>[^)]*)\)\s+"(?P<delim>[^"]*)"\s+(?P<name>.*)$')
+_LIST_RE_NIL = re.compile(r'\((?P<flags>[^)]*)\)\s+(?P<delim>NIL|[^\s]+)\s+(?P<name>.*)$')
+_STATUS_MESSAGES_RE = re.compile(rb'MESSAGES\s+(\d+)', re.IGNORECASE)
+_UND_RE = re.compile(r'_+')
+# Znaki ASCII spoza [A-Za-z0-9._- ] zamieniane na '_' jednym str.translate
+_SAFE_SEGMENT_CHARS = frozenset(string.ascii_letters + string.digits + '._-')
+# Jedna tablica dla ASCII: znaki spoza [A-Za-z0-9._-] (w tym białe znaki) -> '_'
+_SANITIZE_TABLE = {cp: ord('_') for cp in range(128) if chr(cp) not in string.ascii_letters + string.digits + '._-'}
+# Polskie znaki diakrytyczne tłumaczone bezpośrednio (NFKD nie rozkłada 'ł'/'Ł', więc by je gubił)
+_DIACRITICS_TABLE = str.maketrans('ąćęłńóśźżĄĆĘŁŃÓŚŹŻ', 'acelnoszzACELNOSZZ')
+
+# Adres nadawcy: <addr> (ma pierwszeństwo, np. przed adresem w nazwie wyświetlanej) albo goły addr
+_ANGLE_ADDR_RE = re.compile(r'<([^>@\s]+@[^>\s]+)>')
+_ADDR_RE = re.compile(r'[^\s<>,"]+@[^\s<>,"]+')
+
+
+def _extract_addr(value: str) -> str:
+    """Zwraca adres e-mail z nagłówka From (lowercase) albo ''; tańsze niż parseaddr."""
+    m = _ANGLE_ADDR_RE.search(value)
+    if m:
+        return m.group(1).lower()
+    m = _ADDR_RE.search(value)
+    return m.group(0).lower() if m else ''
+
+
+@lru_cache(maxsize=4096)
+def _sanitize_component_cached(s: str, delim: Optional[str]) -> str:
+    """Sanityzuje komponent nazwy folderu do ASCII; wynik zależy tylko od (s, delim)."""
+    if not s:
+        return 'Category'
+    s = s.translate(_DIACRITICS_TABLE)
+    if s.isascii():
+        # NFKD nie zmienia czystego ASCII
+        ascii_only = s
+    else:
+        # Znaki łączące po NFKD są spoza ASCII, więc 'ignore' usuwa je razem z resztą nie-ASCII
+        ascii_only = unicodedata.normalize('NFKD', s).encode('ascii', 'ignore').decode('ascii')
+    cleaned = ascii_only.translate(_SANITIZE_TABLE)
+    cleaned = cleaned.strip('_')
+    if delim:
+        cleaned = cleaned.replace(delim, '_')
+    cleaned = _UND_RE.sub('_', cleaned)
+    return cleaned or 'Category'
+
+
+@lru_cache(maxsize=4096)
+def _encode_mailbox_cached(name: str, delim: str) -> str:
+    """Sanityzuje nie-ASCII ścieżkę folderu segment po segmencie (pierwszy segment bez zmian)."""
+    parts = name.split(delim)
+    if not parts:
+        return _sanitize_component_cached(name, delim)
+    sanitized = [parts[0]]
+    for seg in parts[1:]:
+        sanitized.append(_sanitize_component_cached(seg, delim))
+    return delim.join(sanitized)
+
+
 class FolderManager:
     """Folder-related utilities extracted from EmailOrganizer.
     This manager delegates to the organizer context (ctx) for IMAP access, logging and settings.
     """
 
     def __init__(self, ctx):
-        self.ctx = ctx  # expects attributes: imap, client, verbose, dry_run, _delim_cache
+        self.ctx = ctx  # expects attributes: imap, client, verbose, dry_run, _delim_cache, _folder_cache
 
     # ----- Low-level helpers -----
     def _get_hierarchy_delimiter(self) -> str:
@@ -33,47 +96,25 @@ class FolderManager:
         return self.ctx._delim_cache
 
     def _sanitize_folder_component(self, s: str, delim: str = None) -> str:
-        if not s:
-            return 'Category'
-        norm = unicodedata.normalize('NFKD', s)
-        ascii_only = ''.join(c for c in norm if not unicodedata.combining(c) and ord(c) < 128)
-        allowed = set(string.ascii_letters + string.digits + '._- ')
-        cleaned = ''.join(ch if ch in allowed else '_' for ch in ascii_only)
-        cleaned = re.sub(r'\s+', '_', cleaned).strip('_')
-        if delim:
-            cleaned = cleaned.replace(delim, '_')
-        cleaned = re.sub(r'_+', '_', cleaned)
-        return cleaned or 'Category'
+        return _sanitize_component_cached(s, delim)
 
     def _is_safe_category_segment(self, seg: str) -> bool:
-        if not seg:
-            return False
-        allowed = set(string.ascii_letters + string.digits + '._-')
-        return all((c in allowed) for c in seg)
+        return bool(seg) and _SAFE_SEGMENT_CHARS.issuperset(seg)
 
     def _encode_mailbox(self, name: str) -> str:
         if isinstance(name, (bytes, bytearray)):
-            try:
-                name = bytes(name).decode('ascii')
-            except Exception:
-                name = bytes(name).decode('utf-8', errors='ignore')
-        if all(ord(c) < 128 for c in name):
+            # ASCII jest podzbiorem UTF-8 - jedno dekodowanie zamiast próby ASCII i fallbacku
+            name = name.decode('utf-8', errors='ignore')
+        if name.isascii():
             return name
-        delim = self._get_hierarchy_delimiter()
-        parts = name.split(delim)
-        if not parts:
-            return self._sanitize_folder_component(name, delim)
-        sanitized = [parts[0]]
-        for seg in parts[1:]:
-            sanitized.append(self._sanitize_folder_component(seg, delim))
-        return delim.join(sanitized)
+        return _encode_mailbox_cached(name, self._get_hierarchy_delimiter())
 
     def _parse_list_line(self, raw) -> Tuple[List[str], str, str]:
         try:
             line = raw.decode(errors='ignore') if isinstance(raw, (bytes, bytearray)) else str(raw)
-            m = re.match(r"\((?P<flags>[^)]*)\)\s+\"(?P<delim>[^\"]*)\"\s+(?P<name>.*)$", line)
+            m = _LIST_RE.match(line)
             if not m:
-                m2 = re.match(r"\((?P<flags>[^)]*)\)\s+(?P<delim>NIL|[^\s]+)\s+(?P<name>.*)$", line)
+                m2 = _LIST_RE_NIL.match(line)
                 if not m2:
                     return ([], '/', '')
                 flags_str = m2.group('flags') or ''
@@ -93,44 +134,116 @@ class FolderManager:
         except Exception:
             return ([], '/', '')
 
+    def _load_list(self) -> Optional[List[Tuple[List[str], str, str, int]]]:
+        """Zwraca sparsowany wynik LIST [(flags, delim, name, depth)], cache'owany na ctx._folder_cache.
+
+        Cache jest ważny ctx.folder_cache_ttl sekund dla tego samego połączenia IMAP
+        i aktualizowany lokalnie po CREATE/RENAME/DELETE. None, gdy LIST się nie powiódł.
+        """
+        conn = getattr(self.ctx, 'imap', None)
+        ttl = float(getattr(self.ctx, 'folder_cache_ttl', 60) or 0)
+        cache = getattr(self.ctx, '_folder_cache', None)
+        if cache and ttl > 0 and cache[1] is conn and time.monotonic() - cache[0] < ttl:
+            return cache[2]
+        client = getattr(self.ctx, 'client', None)
+        result, data = client.safe_list() if client else self.ctx.imap.list()
+        if result != 'OK' or not data:
+            return None
+        entries = []
+        for raw in data:
+            if not raw:
+                continue
+            flags, delim, name = self._parse_list_line(raw)
+            if name:
+                entries.append((flags, delim, name, name.count(delim) if delim else 0))
+        self.ctx._folder_cache = (time.monotonic(), conn, entries)
+        return entries
+
+    def _folder_index(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Indeks {pierwszy segment (lower): [(nazwa, ostatni segment)]} budowany raz na wynik LIST."""
+        entries = self._load_list()
+        if entries is None:
+            return {}
+        cache = self.ctx._folder_cache
+        if len(cache) > 3 and cache[2] is entries:
+            return cache[3]
+        delim = self._get_hierarchy_delimiter()
+        index: Dict[str, List[Tuple[str, str]]] = {}
+        for _flags, _delim, name, _depth in entries:
+            parts = name.split(delim) if delim else [name]
+            index.setdefault(parts[0].lower(), []).append((name, parts[-1]))
+        self.ctx._folder_cache = (cache[0], cache[1], entries, index)
+        return index
+
+    def _inbox_folders(self) -> List[Tuple[str, str]]:
+        """(nazwa, ostatni segment) folderów, których nazwa zaczyna się od 'inbox'."""
+        return [item for key, items in self._folder_index().items() if key.startswith('inbox') for item in items]
+
+    def _replace_cached_entries(self, entries: List[Tuple[List[str], str, str, int]]):
+        """Podmienia wpisy cache LIST bez nowego LIST (indeks zbuduje się ponownie przy potrzebie)."""
+        cache = self.ctx._folder_cache
+        self.ctx._folder_cache = (cache[0], cache[1], entries)
+
+    def _cache_add(self, name: str):
+        if not getattr(self.ctx, '_folder_cache', None):
+            return
+        entries = self.ctx._folder_cache[2]
+        if any(e[2] == name for e in entries):
+            return
+        delim = self._get_hierarchy_delimiter()
+        self._replace_cached_entries(entries + [([], delim, name, name.count(delim) if delim else 0)])
+
+    def _cache_rename(self, old: str, new: str):
+        """RENAME przenosi też podfoldery - przepisujemy wszystkie wpisy pod starą nazwą."""
+        if not getattr(self.ctx, '_folder_cache', None):
+            return
+        entries = []
+        for flags, delim, name, depth in self.ctx._folder_cache[2]:
+            if name == old or (delim and name.startswith(old + delim)):
+                name = new + name[len(old):]
+                depth = name.count(delim) if delim else 0
+            entries.append((flags, delim, name, depth))
+        self._replace_cached_entries(entries)
+
+    def _cache_remove(self, name: str):
+        if not getattr(self.ctx, '_folder_cache', None):
+            return
+        self._replace_cached_entries([e for e in self.ctx._folder_cache[2] if e[2] != name])
+
     # ----- High-level operations -----
-    def get_folders(self) -> List[str]:
-        folders: List[str] = []
+    def get_folders(self, subscribed_only: bool = False) -> List[str]:
+        if subscribed_only:
+            return self._load_subscribed()
+        return [name for _flags, _delim, name, _depth in (self._load_list() or [])]
+
+    def _load_subscribed(self) -> List[str]:
+        """Foldery subskrybowane (LSUB) - koszt zależy od liczby subskrypcji, nie całego drzewa; bez cache."""
         client = getattr(self.ctx, 'client', None)
-        result, folder_list = client.safe_list() if client else self.ctx.imap.list()
-        for raw in folder_list or []:
+        result, data = client.safe_lsub() if client else self.ctx.imap.lsub()
+        if result != 'OK' or not data:
+            return []
+        names = []
+        for raw in data:
             if not raw:
                 continue
-            _flags, _delim, folder_name = self._parse_list_line(raw)
-            if folder_name:
-                folders.append(folder_name)
-        return folders
+            _flags, _delim, name = self._parse_list_line(raw)
+            if name:
+                names.append(name)
+        return names
 
     def print_mailbox_structure(self, max_items: int = 500):
         if not getattr(self.ctx, 'verbose', False):
             return
         try:
-            client = getattr(self.ctx, 'client', None)
-            result, data = client.safe_list() if client else self.ctx.imap.list()
-            if result != 'OK' or not data:
+            entries = self._load_list()
+            if entries is None:
                 print("ℹ️ Nie udało się pobrać listy folderów (LIST)")
                 return
-            folders = []
-            for raw in data:
-                if not raw:
-                    continue
-                _flags, delim_char, name = self._parse_list_line(raw)
-                if not name:
-                    continue
-                if name in ('.', '..'):
-                    continue
-                depth = name.count(delim_char) if delim_char else 0
-                folders.append((name, depth))
-            folders.sort(key=lambda x: x[0])
+            # Głębokość policzona raz przy parsowaniu LIST; sortujemy i formatujemy tylko max_items pozycji
+            folders = [(name, depth) for _flags, _delim, name, depth in entries if name not in ('.', '..')]
             print(f"\n📂 Struktura skrzynki ({len(folders)} folderów):")
-            for name, depth in folders[:max_items]:
-                indent = '  ' * depth
-                print(f"  {indent}• {name}")
+            top = heapq.nsmallest(max_items, folders, key=lambda x: x[0])
+            print('\n'.join(f"  {'  ' * depth}• {name}" for name, depth in top))
         except Exception as e:
             print(f"ℹ️ Nie udało się wyświetlić struktury skrzynki: {e}")
 
@@ -144,6 +257,7 @@ class FolderManager:
             client = getattr(self.ctx, 'client', None)
             typ, resp = client.safe_create(mailbox) if client else self.ctx.imap.create(mailbox)
             if typ == 'OK':
+                self._cache_add(mailbox)
                 if getattr(self.ctx, 'verbose', False):
                     print(f"📁 Utworzono folder: {folder_name}")
             else:
@@ -215,16 +329,8 @@ class FolderManager:
         return candidates
 
     def _list_category_folders(self) -> List[str]:
-        folders = self.get_folders()
-        delim = self._get_hierarchy_delimiter()
         cat_folders: List[str] = []
-        for f in folders:
-            if not f:
-                continue
-            low = f.lower()
-            if not low.startswith('inbox'):
-                continue
-            last = f.split(delim)[-1] if delim else f
+        for f, last in self._inbox_folders():
             if last.lower().startswith('category_'):
                 if not self._is_safe_category_segment(last):
                     continue
@@ -238,13 +344,7 @@ class FolderManager:
                 return
             delim = self._get_hierarchy_delimiter()
             existing = set(folders)
-            for f in list(folders):
-                if not f:
-                    continue
-                low = f.lower()
-                if not low.startswith('inbox'):
-                    continue
-                last = f.split(delim)[-1] if delim else f
+            for f, last in self._inbox_folders():
                 if not last.lower().startswith('category_'):
                     continue
                 if self._is_safe_category_segment(last):
@@ -270,6 +370,7 @@ class FolderManager:
                     client = getattr(self.ctx, 'client', None)
                     typ, resp = client.safe_rename(old_mb, new_mb) if client else self.ctx.imap.rename(old_mb, new_mb)
                     if typ == 'OK':
+                        self._cache_rename(old_mb, new_mb)
                         if getattr(self.ctx, 'verbose', False):
                             print(f"📂 Zmieniono nazwę folderu: {f} -> {candidate}")
                         try:
@@ -294,22 +395,31 @@ class FolderManager:
             folders = self.get_folders()
             delim = self._get_hierarchy_delimiter()
             to_delete: List[str] = []
-            for name in folders:
-                if not name:
-                    continue
-                last = name.split(delim)[-1] if delim else name
+            # Wszystkie przodki (prefiksy do delimitera) - sprawdzenie podfolderów w O(1) zamiast skanu listy
+            parents = set()
+            if delim:
+                for f in folders:
+                    i = f.find(delim)
+                    while i != -1:
+                        parents.add(f[:i])
+                        i = f.find(delim, i + 1)
+            for name, last in (item for items in self._folder_index().values() for item in items):
                 if not last.lower().startswith('category'):
                     continue
-                has_children = any((f != name) and f.startswith(name + (delim or '')) for f in folders)
+                if delim:
+                    has_children = name in parents
+                else:
+                    has_children = any((f != name) and f.startswith(name) for f in folders)
                 if has_children:
                     continue
+                # STATUS zwraca liczbę wiadomości bez SELECT i bez listy UID
                 client = getattr(self.ctx, 'client', None)
-                typ, _ = client.safe_select(name, readonly=True) if client else self.ctx.imap.select(name, readonly=True)
-                if typ != 'OK':
+                typ, data = client.safe_status(name, '(MESSAGES)') if client else self.ctx.imap.status(name, '(MESSAGES)')
+                if typ != 'OK' or not data:
                     continue
-                res, data = client.safe_uid('SEARCH', None, 'ALL') if client else self.ctx.imap.uid('SEARCH', None, 'ALL')
-                count = len(data[0].split()) if res == 'OK' and data and data[0] else 0
-                if count == 0:
+                raw = data[0] if isinstance(data[0], (bytes, bytearray)) else str(data[0]).encode()
+                m = _STATUS_MESSAGES_RE.search(raw)
+                if m and int(m.group(1)) == 0:
                     to_delete.append(name)
             for mbox in to_delete:
                 try:
@@ -328,6 +438,7 @@ class FolderManager:
                         pass
                     typ, resp = client.safe_delete(mailbox) if client else self.ctx.imap.delete(mailbox)
                     if typ == 'OK':
+                        self._cache_remove(mailbox)
                         if getattr(self.ctx, 'verbose', False):
                             print(f"🗑️  Usunięto pusty folder kategorii: {mbox}")
                     else:
@@ -354,6 +465,47 @@ class FolderManager:
             sanitized.append(self._sanitize_folder_component(seg, delim))
         return delim.join(sanitized)
 
+    def _fetch_candidate_samples(self, candidates: List[str], per_folder: int) -> List[Tuple[str, List[Dict]]]:
+        """Pobiera próbki wiadomości z folderów; przy ctx.folder_fetch_workers > 1 równolegle.
+
+        Każdy wątek używa własnego połączenia z puli ctx._extra_clients (otwieranej raz,
+        zamykanej w disconnect()). Foldery, których nie udało się pobrać równolegle,
+        są pobierane sekwencyjnie głównym połączeniem.
+        """
+        workers = min(int(getattr(self.ctx, 'folder_fetch_workers', 0) or 0), len(candidates))
+        results: Dict[str, List[Dict]] = {}
+        if workers > 1 and hasattr(self.ctx, '_open_extra_client'):
+            pool = getattr(self.ctx, '_extra_clients', None)
+            if pool is None:
+                pool = self.ctx._extra_clients = []
+            try:
+                while len(pool) < workers:
+                    pool.append(self.ctx._open_extra_client())
+            except Exception as e:
+                if getattr(self.ctx, 'verbose', False):
+                    print(f"ℹ️  Dodatkowe połączenie IMAP niedostępne: {e}")
+            queue = list(candidates)
+            lock = threading.Lock()
+
+            def worker(client):
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        folder = queue.pop(0)
+                    try:
+                        results[folder] = self.ctx._fetch_messages_from_folder(folder, per_folder, client=client)
+                    except Exception:
+                        pass
+
+            if len(pool) > 1:
+                with ThreadPoolExecutor(max_workers=len(pool[:workers])) as ex:
+                    list(ex.map(worker, pool[:workers]))
+        for folder in candidates:
+            if folder not in results:
+                results[folder] = self.ctx._fetch_messages_from_folder(folder, per_folder)
+        return [(folder, results[folder]) for folder in candidates]
+
     def _choose_existing_category_folder(self, cluster_emails: List[Dict]) -> str:
         candidates = self._list_category_folders()
         if not candidates or not cluster_emails:
@@ -361,41 +513,41 @@ class FolderManager:
         cluster_texts = [f"{e.get('subject','')} {e.get('body','')}" for e in cluster_emails]
         cluster_froms = set()
         for e in cluster_emails:
-            from email.utils import parseaddr
-            _disp, a = parseaddr(e.get('from','') or '')
+            a = _extract_addr(e.get('from','') or '')
             if a:
-                cluster_froms.add(a.lower())
-                if '@' in a:
-                    cluster_froms.add(a.lower().split('@')[-1])
+                cluster_froms.add(a)
+                cluster_froms.add(a.split('@')[-1])
         # Fetch messages from candidate folders via organizer helper
+        per_folder = max(1, int(self.ctx.category_sample_limit))
+        folder_msgs = [(f, msgs) for f, msgs in self._fetch_candidate_samples(candidates, per_folder) if msgs]
+        if not folder_msgs:
+            return ''
+        # Jeden słownik TF-IDF i jedno podobieństwo cosinusowe dla klastra i wszystkich folderów
+        all_texts = list(cluster_texts)
+        bounds = [0]
+        for _folder, msgs in folder_msgs:
+            all_texts.extend(f"{m.get('subject','')} {m.get('body','')}" for m in msgs)
+            bounds.append(len(all_texts) - len(cluster_texts))
+        try:
+            tfidf = self.ctx._make_vectorizer().fit_transform(all_texts)
+            all_sims = cosine_similarity(tfidf[:len(cluster_texts)], tfidf[len(cluster_texts):])
+        except Exception:
+            all_sims = None
         best_folder = ''
         best_score = -1.0
         thr = float(self.ctx.category_match_similarity)
         sender_w = float(self.ctx.category_sender_weight)
-        per_folder = max(1, int(self.ctx.category_sample_limit))
-        for folder in candidates:
-            msgs = self.ctx._fetch_messages_from_folder(folder, per_folder)
-            if not msgs:
-                continue
-            folder_texts = [f"{m.get('subject','')} {m.get('body','')}" for m in msgs]
-            try:
-                vec = self.ctx._make_vectorizer()
-                all_texts = cluster_texts + folder_texts
-                tfidf = vec.fit_transform(all_texts)
-                c_mat = tfidf[:len(cluster_texts)]
-                f_mat = tfidf[len(cluster_texts):]
-                sims = cosine_similarity(c_mat, f_mat)
+        for i, (folder, msgs) in enumerate(folder_msgs):
+            content_score = 0.0
+            if all_sims is not None:
+                sims = all_sims[:, bounds[i]:bounds[i + 1]]
                 content_score = float(np.mean(np.max(sims, axis=1))) if sims.size else 0.0
-            except Exception:
-                content_score = 0.0
             folder_froms = set()
-            from email.utils import parseaddr
             for m in msgs:
-                _d2, a2 = parseaddr(m.get('from','') or '')
+                a2 = _extract_addr(m.get('from','') or '')
                 if a2:
-                    folder_froms.add(a2.lower())
-                    if '@' in a2:
-                        folder_froms.add(a2.lower().split('@')[-1])
+                    folder_froms.add(a2)
+                    folder_froms.add(a2.split('@')[-1])
             sender_overlap = 0.0
             if cluster_froms and folder_froms:
                 sender_overlap = len(cluster_froms.intersection(folder_froms)) / max(1, len(cluster_emails))
@@ -1,6 +1,80 @@
 from typing import List
+import re
 import time
 
+from llmass.imap.seqset import to_sequence_set
+from llmass.organizer.actions import supports_move
+
+
+# Maksymalna długość zbioru sekwencji w jednym poleceniu COPY/MOVE/STORE
+MAX_SEQSET_LEN = 1000
+
+_UID_RE = re.compile(rb'UID\s+(\d+)', re.IGNORECASE)
+
+
+def _move_all(bot, client, seq_nums: List[bytes], mailbox_encoded: str, progress_label: str, error_label: str) -> int:
+    """
+    Przenosi wszystkie wiadomości wybranego folderu do mailbox_encoded i zwraca ich liczbę.
+
+    Używa MOVE (RFC 6851) w batchach po 1000, a bez niego COPY + STORE \\Deleted + EXPUNGE
+    po 50. Po każdym batchu serwer numeruje pozostałe wiadomości od 1, więc każdy batch
+    to początek skrzynki.
+    """
+    use_move = supports_move(bot)
+    batch_size = 1000 if use_move else 50
+    total = len(seq_nums)
+    moved = 0
+    batch_no = 0
+    while moved < total:
+        batch = seq_nums[:min(batch_size, total - moved)]
+        batch_str = to_sequence_set(batch)
+        # Limit długości polecenia ("maximum request size exceeded" na części serwerów)
+        while len(batch_str) > MAX_SEQSET_LEN and len(batch) > 1:
+            batch = batch[:len(batch) // 2]
+            batch_str = to_sequence_set(batch)
+        batch_no += 1
+        try:
+            if use_move:
+                typ, resp = client.safe_move(batch_str, mailbox_encoded) if client else bot.imap.move(batch_str, mailbox_encoded)
+                if typ != 'OK':
+                    raise RuntimeError(f"MOVE: {typ} {resp}")
+            else:
+                typ, resp = client.safe_copy(batch_str, mailbox_encoded) if client else bot.imap.copy(batch_str, mailbox_encoded)
+                if typ != 'OK':
+                    raise RuntimeError(f"COPY: {typ} {resp}")
+                # Kolejny batch zakłada, że ten zniknął ze skrzynki - inaczej kopiowalibyśmy ten sam początek
+                typ, resp = client.safe_store(batch_str, '+FLAGS', '\\Deleted') if client else bot.imap.store(batch_str, '+FLAGS', '\\Deleted')
+                if typ != 'OK':
+                    raise RuntimeError(f"STORE \\Deleted: {typ} {resp}")
+                typ, resp = client.safe_expunge() if client else bot.imap.expunge()
+                if typ != 'OK':
+                    raise RuntimeError(f"EXPUNGE: {typ} {resp}")
+            moved += len(batch)
+            print(f"   {progress_label}: {moved}/{total} emaili", end='\r')
+        except Exception as e:
+            print(f"\n❌ Błąd podczas {error_label} batch {batch_no}: {e}")
+            break
+    return moved
+
+
+def _count_readable_uids(bot, client, uids: List[bytes]) -> int:
+    """Pobiera FLAGS dla wszystkich uids jednym UID FETCH i zwraca liczbę UID obecnych w odpowiedzi."""
+    if not uids:
+        return 0
+    uid_set = to_sequence_set(uids)
+    result, data = (client.safe_uid('FETCH', uid_set, '(FLAGS)') if client else bot.imap.uid('FETCH', uid_set, '(FLAGS)'))
+    if result != 'OK' or not data:
+        return 0
+    wanted = {bytes(u) if isinstance(u, (bytes, bytearray)) else str(u).encode() for u in uids}
+    found = set()
+    for item in data:
+        head = item[0] if isinstance(item, tuple) else item
+        if isinstance(head, (bytes, bytearray)):
+            m = _UID_RE.search(head)
+            if m and m.group(1) in wanted:
+                found.add(m.group(1))
+    return len(found)
+
 
 def repair_mailbox(bot, folder: str = 'INBOX', force: bool = False, dry_run: bool = False):
     """
@@ -41,12 +115,7 @@ def repair_mailbox(bot, folder: str = 'INBOX', force: bool = False, dry_run: boo
         result, data = (client.safe_uid('SEARCH', None, 'ALL') if client else bot.imap.uid('SEARCH', None, 'ALL'))
         if result == 'OK' and data and data[0]:
             uids = data[0].split()[:10]  # Test pierwszych 10 UIDs
-            corrupted_count = 0
-
-            for uid in uids:
-                result, test_data = (client.safe_uid('FETCH', uid, '(FLAGS)') if client else bot.imap.uid('FETCH', uid, '(FLAGS)'))
-                if result != 'OK' or not test_data or test_data == [None]:
-                    corrupted_count += 1
+            corrupted_count = len(uids) - _count_readable_uids(bot, client, uids)
 
             corruption_ratio = corrupted_count / len(uids) if uids else 0
             print(f"   Corruption ratio: {corruption_ratio:.1%} ({corrupted_count}/{len(uids)} UIDs)")
@@ -92,33 +161,7 @@ def repair_mailbox(bot, folder: str = 'INBOX', force: bool = False, dry_run: boo
                 if getattr(bot, 'verbose', False):
                     print(f"🧪 [DRY-RUN] Przeniosłbym {total_emails} emaili")
             else:
-                # Przenoś po batch (50 naraz)
-                batch_size = 50
-                moved_count = 0
-
-                for i in range(0, len(seq_nums), batch_size):
-                    batch = seq_nums[i:i+batch_size]
-                    batch_str = ','.join([num.decode() if isinstance(num, bytes) else str(num) for num in batch])
-
-                    try:
-                        # COPY + STORE \Deleted + EXPUNGE
-                        mailbox_encoded = bot._encode_mailbox(repair_folder)
-                        if client:
-                            client.safe_copy(batch_str, mailbox_encoded)
-                            client.safe_store(batch_str, '+FLAGS', '\\Deleted')
-                            client.safe_expunge()
-                        else:
-                            bot.imap.copy(batch_str, mailbox_encoded)
-                            bot.imap.store(batch_str, '+FLAGS', '\\Deleted')
-                            bot.imap.expunge()
-
-                        moved_count += len(batch)
-                        print(f"   Przeniesiono: {moved_count}/{total_emails} emaili", end='\r')
-
-                    except Exception as e:
-                        print(f"\n❌ Błąd podczas przenoszenia batch {i//batch_size + 1}: {e}")
-                        break
-
+                moved_count = _move_all(bot, client, seq_nums, bot._encode_mailbox(repair_folder), "Przeniesiono", "przenoszenia")
                 print(f"\n✅ Przeniesiono {moved_count} emaili do folderu tymczasowego")
 
         # Krok 5: Przenieś z powrotem
@@ -134,31 +177,7 @@ def repair_mailbox(bot, folder: str = 'INBOX', force: bool = False, dry_run: boo
                 if result == 'OK' and data and data[0]:
                     seq_nums = data[0].split()
 
-                    # Przenoś z powrotem po batch
-                    moved_back = 0
-                    batch_size = 50
-                    for i in range(0, len(seq_nums), batch_size):
-                        batch = seq_nums[i:i+batch_size]
-                        batch_str = ','.join([num.decode() if isinstance(num, bytes) else str(num) for num in batch])
-
-                        try:
-                            mailbox_encoded = bot._encode_mailbox(folder)
-                            if client:
-                                client.safe_copy(batch_str, mailbox_encoded)
-                                client.safe_store(batch_str, '+FLAGS', '\\Deleted')
-                                client.safe_expunge()
-                            else:
-                                bot.imap.copy(batch_str, mailbox_encoded)
-                                bot.imap.store(batch_str, '+FLAGS', '\\Deleted')
-                                bot.imap.expunge()
-
-                            moved_back += len(batch)
-                            print(f"   Przywrócono: {moved_back}/{len(seq_nums)} emaili", end='\r')
-
-                        except Exception as e:
-                            print(f"\n❌ Błąd podczas przywracania batch {i//batch_size + 1}: {e}")
-                            break
-
+                    moved_back = _move_all(bot, client, seq_nums, bot._encode_mailbox(folder), "Przywrócono", "przywracania")
                     print(f"\n✅ Przywrócono {moved_back} emaili do {folder}")
         else:
             if getattr(bot, 'verbose', False):
@@ -168,12 +187,19 @@ def repair_mailbox(bot, folder: str = 'INBOX', force: bool = False, dry_run: boo
         print(f"🗑️  Usuwam folder tymczasowy: {repair_folder}")
         if not dry_run:
             try:
+                mailbox = bot._encode_mailbox(repair_folder)
                 if client:
                     client.safe_select()
-                    client.safe_delete(bot._encode_mailbox(repair_folder))
+                    typ, resp = client.safe_delete(mailbox)
                 else:
                     bot.imap.select()  # Deselect current folder
-                    bot.imap.delete(bot._encode_mailbox(repair_folder))
+                    typ, resp = bot.imap.delete(mailbox)
+                if typ != 'OK':
+                    raise RuntimeError(f"DELETE: {typ} {resp}")
+                folders = getattr(bot, 'folders', None)
+                if folders:
+                    # Cache LIST aktualizowany lokalnie, jak po CREATE/RENAME/DELETE w FolderManager
+                    folders._cache_remove(mailbox)
                 print("✅ Folder tymczasowy usunięty")
             except Exception as e:
                 print(f"⚠️  Nie można usunąć folderu tymczasowego: {e}")
@@ -190,12 +216,7 @@ def repair_mailbox(bot, folder: str = 'INBOX', force: bool = False, dry_run: boo
                 result, data = (client.safe_uid('SEARCH', None, 'ALL') if client else bot.imap.uid('SEARCH', None, 'ALL'))
                 if result == 'OK' and data and data[0]:
                     uids = data[0].split()[:10]
-                    working_count = 0
-
-                    for uid in uids:
-                        result, test_data = (client.safe_uid('FETCH', uid, '(FLAGS)') if client else bot.imap.uid('FETCH', uid, '(FLAGS)'))
-                        if result == 'OK' and test_data and test_data != [None]:
-                            working_count += 1
+                    working_count = _count_readable_uids(bot, client, uids)
 
                     success_ratio = working_count / len(uids) if uids else 0
                     print(f"   UIDs working: {success_ratio:.1%} ({working_count}/{len(uids)})")
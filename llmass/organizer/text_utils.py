@@ -1,17 +1,50 @@
 from typing import Optional
+import hashlib
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 
+def _vectorizer_params(stopwords_mode: Optional[str], max_features: Optional[int]) -> tuple:
+    """TfidfVectorizer kwargs for (stopwords_mode, max_features), as a hashable tuple (also the memo key)."""
+    stop = 'english' if stopwords_mode in ('english', 'en') else None
+    return (('max_features', max_features), ('stop_words', stop), ('dtype', np.float32))
+
+
 def make_vectorizer(ctx=None, stopwords_mode: Optional[str] = None, max_features: Optional[int] = None) -> TfidfVectorizer:
     """
     Create a configured TfidfVectorizer based on context or explicit params.
     - If ctx is provided, reads ctx.stopwords_mode and ctx.tfidf_max_features.
     - Supports 'english' stopwords; others default to None for now.
+    - Uses float32 matrices: cosine scores need no more precision and the sparse products touch half the bytes.
+    - Each call returns a fresh, unfitted instance.
     """
     sw_mode = stopwords_mode if stopwords_mode is not None else getattr(ctx, 'stopwords_mode', None)
     max_feats = max_features if max_features is not None else getattr(ctx, 'tfidf_max_features', None)
+    return TfidfVectorizer(**dict(_vectorizer_params(sw_mode, max_feats)))
+
+
+def _corpus_digest(texts) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for t in texts:
+        h.update(t.encode('utf-8', 'surrogatepass'))
+        h.update(b'\0')
+    return h.digest()
 
-    stop = None
-    if sw_mode in ('english', 'en'):
-        stop = 'english'
-    return TfidfVectorizer(max_features=max_feats, stop_words=stop)
+
+def fit_transform_cached(ctx, texts) -> tuple:
+    """Returns (fitted vectorizer, tfidf matrix) for texts, memoized on ctx for the last corpus.
+
+    Repeated categorization of the same corpus by the same organizer skips tokenization
+    and IDF fitting. Only one entry, keyed on a digest of the texts and the config, is kept
+    per ctx, so nothing is pinned process-wide and fitted estimators are never shared
+    between organizers. The results must not be mutated.
+    """
+    params = _vectorizer_params(getattr(ctx, 'stopwords_mode', None), getattr(ctx, 'tfidf_max_features', None))
+    key = (_corpus_digest(texts), params)
+    memo = getattr(ctx, '_tfidf_memo', None)
+    if memo is not None and memo[0] == key:
+        return memo[1], memo[2]
+    vec = TfidfVectorizer(**dict(params))
+    matrix = vec.fit_transform(texts)
+    ctx._tfidf_memo = (key, vec, matrix)
+    return vec, matrix
@@ -10,18 +10,182 @@ Komendy:
 
 __version__ = "1.1.17"
 
+import os
 import sys
-import argparse
-from typing import List
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, List, Optional
 
+if TYPE_CHECKING:
+    import argparse
+
+
+# Komenda -> (help, description); top-level --help potrzebuje tylko pierwszego pola
+_COMMANDS = {
+    'generate': ('Generuj testowe emaile', 'Generowanie testowych emaili dla środowiska testowego'),
+    'clean': ('Organizuj i kategoryzuj emaile', 'Automatyczne grupowanie, kategoryzacja i usuwanie spamu'),
+    'write': ('Generuj odpowiedzi AI na emaile', 'Automatyczne tworzenie odpowiedzi z użyciem LLM'),
+    'repair': ('Napraw corruption skrzynki IMAP', 'Automatyczna naprawa uszkodzonych UIDs w skrzynce IMAP'),
+    'test': ('Uruchom testy jednostkowe', 'Testy funkcjonalności llmass'),
+}
+
+# Flagi komend: ((nazwy flag), kwargs add_argument) - wspólne źródło dla argparse i _fast_parse
+_FLAG_SPECS = {
+    'generate': (
+        (('--smtp-host',), {'default': 'localhost', 'help': 'Host SMTP'}),
+        (('--smtp-port',), {'type': int, 'default': 1025, 'help': 'Port SMTP'}),
+        (('--num-emails',), {'type': int, 'help': 'Liczba emaili do wygenerowania'}),
+        (('--spam-ratio',), {'type': float, 'help': 'Proporcja spamu (0-1)'}),
+        (('--to',), {'help': 'Adres odbiorcy'}),
+    ),
+    'clean': (
+        (('--email',), {'help': 'Adres email'}),
+        (('--password',), {'help': 'Hasło'}),
+        (('--server',), {'help': 'Serwer IMAP'}),
+        (('--dry-run',), {'action': 'store_true', 'help': 'Tryb testowy (bez zmian)'}),
+        (('--limit',), {'type': int, 'help': 'Limit emaili do przetworzenia'}),
+        (('--since-days',), {'type': int, 'help': 'Ile dni wstecz'}),
+        (('--since-date',), {'help': 'Data początkowa (YYYY-MM-DD)'}),
+        (('--folder',), {'default': 'INBOX', 'help': 'Folder do przetworzenia'}),
+        (('--include-subfolders',), {'action': 'store_true', 'help': 'Przetwarzaj podfoldery'}),
+        (('--similarity-threshold',), {'type': float, 'help': 'Próg podobieństwa (0-1)'}),
+        (('--min-cluster-size',), {'type': int, 'help': 'Minimalny rozmiar klastra'}),
+        (('--min-cluster-fraction',), {'type': float, 'help': 'Minimalny udział klastra (0-1)'}),
+        (('--verbose', '-v'), {'action': 'store_true', 'help': 'Tryb verbose - pokaż wszystkie szczegóły'}),
+    ),
+    'write': (
+        (('--email',), {'help': 'Adres email'}),
+        (('--password',), {'help': 'Hasło'}),
+        (('--server',), {'help': 'Serwer IMAP'}),
+        (('--smtp',), {'help': 'Serwer SMTP'}),
+        (('--model',), {'help': 'Model LLM (domyślnie: Qwen/Qwen2.5-7B-Instruct)'}),
+        (('--folder',), {'default': 'INBOX', 'help': 'Folder do przetworzenia'}),
+        (('--limit',), {'type': int, 'help': 'Limit emaili'}),
+        (('--since-days',), {'type': int, 'help': 'Ile dni wstecz'}),
+        (('--since-date',), {'help': 'Data początkowa (YYYY-MM-DD)'}),
+        (('--all-emails',), {'action': 'store_true', 'help': 'Przetwarzaj wszystkie (nie tylko nieprzeczytane)'}),
+        (('--dry-run',), {'action': 'store_true', 'help': 'Nie zapisuj draftów'}),
+        (('--temperature',), {'type': float, 'help': 'Temperatura generowania (0-1)'}),
+        (('--max-tokens',), {'type': int, 'help': 'Maksymalna długość odpowiedzi'}),
+        (('--offline',), {'action': 'store_true', 'help': 'Tryb offline (mock responses)'}),
+    ),
+    'repair': (
+        (('--email',), {'help': 'Adres email'}),
+        (('--password',), {'help': 'Hasło'}),
+        (('--server',), {'help': 'Serwer IMAP'}),
+        (('--folder',), {'default': 'INBOX', 'help': 'Folder do naprawy'}),
+        (('--dry-run',), {'action': 'store_true', 'help': 'Tryb testowy (bez zmian)'}),
+        (('--force',), {'action': 'store_true', 'help': 'Wymusza naprawę bez potwierdzenia'}),
+    ),
+    'test': (
+        (('--verbose', '-v'), {'action': 'store_true', 'help': 'Tryb verbose'}),
+        (('--quick',), {'action': 'store_true', 'help': 'Szybkie testy (bez integracyjnych)'}),
+    ),
+}
+
+
+def _build_subparser(subparsers, command: str):
+    help_text, description = _COMMANDS[command]
+    sp = subparsers.add_parser(command, help=help_text, description=description)
+    for names, kwargs in _FLAG_SPECS[command]:
+        sp.add_argument(*names, **kwargs)
+
+
+def _sniff_subcommand(argv: List[str]) -> Optional[str]:
+    """Zwraca nazwę komendy, jeśli pierwszy argument niebędący flagą jest znaną komendą."""
+    for token in argv:
+        if not token.startswith('-'):
+            return token if token in _COMMANDS else None
+    return None
+
+
+def _fast_flags(command: str) -> dict:
+    """Flaga -> (atrybut, typ, domyślna) wyprowadzone z _FLAG_SPECS; typ bool oznacza store_true."""
+    flags = {}
+    for names, kwargs in _FLAG_SPECS[command]:
+        dest = names[0].lstrip('-').replace('-', '_')
+        if kwargs.get('action') == 'store_true':
+            spec = (dest, bool, False)
+        else:
+            spec = (dest, kwargs.get('type', str), kwargs.get('default'))
+        for name in names:
+            flags[name] = spec
+    return flags
+
+
+_FAST_FLAGS = {command: _fast_flags(command) for command in _FLAG_SPECS}
+
+
+def _fast_parse(command: str, argv: List[str]) -> Optional[SimpleNamespace]:
+    """Parsuje `--flaga wartość`, `--flaga=wartość` i przełączniki bez budowania argparse.
+
+    Zwraca None, gdy wejście wymaga argparse (nieznana lub skrócona flaga, brak/zła wartość),
+    który wtedy zgłosi błąd w standardowej formie.
+    """
+    flags = _FAST_FLAGS[command]
+    values = {dest: default for dest, _typ, default in flags.values()}
+    i, n = 0, len(argv)
+    while i < n:
+        name, eq, value = argv[i].partition('=')
+        spec = flags.get(name)
+        if spec is None:
+            return None
+        dest, typ, _default = spec
+        i += 1
+        if typ is bool:
+            if eq:
+                return None
+            values[dest] = True
+            continue
+        if not eq:
+            if i >= n or argv[i].startswith('-'):
+                return None
+            value = argv[i]
+            i += 1
+        try:
+            values[dest] = typ(value)
+        except ValueError:
+            return None
+    return SimpleNamespace(command=command, **values)
+
+
+# Tryb budowania parsera ze wszystkimi komendami (poza nazwami komend)
+_ALL_COMMANDS = '<all>'
+
+# Top-level --help jako gotowy tekst - bez maszynerii formatowania argparse
+_TOPLEVEL_HELP = '\n'.join([
+    f"usage: llmass [-h] [--version] {{{','.join(_COMMANDS)}}} ...",
+    '',
+    'AI-powered email management and automation system',
+    '',
+    'Dostępne komendy:',
+    *(f"  {name:<10}{help_text}" for name, (help_text, _description) in _COMMANDS.items()),
+    '',
+    'options:',
+    '  -h, --help     show this help message and exit',
+    "  --version, -V  show program's version number and exit",
+    '',
+    'Użyj "llmass <komenda> --help" dla szczegółów każdej komendy',
+])
+
+
+@lru_cache(maxsize=None)
+def _get_parser(mode: str) -> 'argparse.ArgumentParser':
+    """Parser dla danego trybu, budowany raz na proces (parse_args zwraca za każdym razem nowy Namespace).
+
+    mode: nazwa komendy (tylko jej subparser) lub _ALL_COMMANDS. Top-level --help obsługuje main()
+    (_TOPLEVEL_HELP), więc parser główny nie ma akcji help.
+    argparse jest importowany dopiero tutaj - szybka ścieżka (_fast_parse) go nie potrzebuje.
+    """
+    import argparse
 
-def main():
-    """Główny entry point dla llmass CLI"""
     parser = argparse.ArgumentParser(
         prog='llmass',
         description='AI-powered email management and automation system',
-        epilog='Użyj "llmass <komenda> --help" dla szczegółów każdej komendy'
+        epilog='Użyj "llmass <komenda> --help" dla szczegółów każdej komendy',
+        add_help=False,
     )
+    parser.add_argument('--version', '-V', action='version', version=f'llmass {__version__}')
     
     subparsers = parser.add_subparsers(
         dest='command',
@@ -29,97 +193,61 @@ def main():
         required=True
     )
     
-    # === llmass generate (email generator) ===
-    generate_parser = subparsers.add_parser(
-        'generate',
-        help='Generuj testowe emaile',
-        description='Generowanie testowych emaili dla środowiska testowego'
-    )
-    generate_parser.add_argument('--smtp-host', default='localhost', help='Host SMTP')
-    generate_parser.add_argument('--smtp-port', type=int, default=1025, help='Port SMTP')
-    generate_parser.add_argument('--num-emails', type=int, help='Liczba emaili do wygenerowania')
-    generate_parser.add_argument('--spam-ratio', type=float, help='Proporcja spamu (0-1)')
-    generate_parser.add_argument('--to', help='Adres odbiorcy')
-    
-    # === llmass clean (email organizer) ===
-    clean_parser = subparsers.add_parser(
-        'clean',
-        help='Organizuj i kategoryzuj emaile',
-        description='Automatyczne grupowanie, kategoryzacja i usuwanie spamu'
-    )
-    clean_parser.add_argument('--email', help='Adres email')
-    clean_parser.add_argument('--password', help='Hasło')
-    clean_parser.add_argument('--server', help='Serwer IMAP')
-    clean_parser.add_argument('--dry-run', action='store_true', help='Tryb testowy (bez zmian)')
-    clean_parser.add_argument('--limit', type=int, help='Limit emaili do przetworzenia')
-    clean_parser.add_argument('--since-days', type=int, help='Ile dni wstecz')
-    clean_parser.add_argument('--since-date', help='Data początkowa (YYYY-MM-DD)')
-    clean_parser.add_argument('--folder', default='INBOX', help='Folder do przetworzenia')
-    clean_parser.add_argument('--include-subfolders', action='store_true', help='Przetwarzaj podfoldery')
-    clean_parser.add_argument('--similarity-threshold', type=float, help='Próg podobieństwa (0-1)')
-    clean_parser.add_argument('--min-cluster-size', type=int, help='Minimalny rozmiar klastra')
-    clean_parser.add_argument('--min-cluster-fraction', type=float, help='Minimalny udział klastra (0-1)')
-    clean_parser.add_argument('--verbose', '-v', action='store_true', help='Tryb verbose - pokaż wszystkie szczegóły')
-    
-    # === llmass write (email responder) ===
-    write_parser = subparsers.add_parser(
-        'write',
-        help='Generuj odpowiedzi AI na emaile',
-        description='Automatyczne tworzenie odpowiedzi z użyciem LLM'
-    )
-    write_parser.add_argument('--email', help='Adres email')
-    write_parser.add_argument('--password', help='Hasło')
-    write_parser.add_argument('--server', help='Serwer IMAP')
-    write_parser.add_argument('--smtp', help='Serwer SMTP')
-    write_parser.add_argument('--model', help='Model LLM (domyślnie: Qwen/Qwen2.5-7B-Instruct)')
-    write_parser.add_argument('--folder', default='INBOX', help='Folder do przetworzenia')
-    write_parser.add_argument('--limit', type=int, help='Limit emaili')
-    write_parser.add_argument('--since-days', type=int, help='Ile dni wstecz')
-    write_parser.add_argument('--since-date', help='Data początkowa (YYYY-MM-DD)')
-    write_parser.add_argument('--all-emails', action='store_true', help='Przetwarzaj wszystkie (nie tylko nieprzeczytane)')
-    write_parser.add_argument('--dry-run', action='store_true', help='Nie zapisuj draftów')
-    write_parser.add_argument('--temperature', type=float, help='Temperatura generowania (0-1)')
-    write_parser.add_argument('--max-tokens', type=int, help='Maksymalna długość odpowiedzi')
-    write_parser.add_argument('--offline', action='store_true', help='Tryb offline (mock responses)')
-    
-    # === llmass repair ===
-    repair_parser = subparsers.add_parser(
-        'repair',
-        help='Napraw corruption skrzynki IMAP',
-        description='Automatyczna naprawa uszkodzonych UIDs w skrzynce IMAP'
-    )
-    repair_parser.add_argument('--email', help='Adres email')
-    repair_parser.add_argument('--password', help='Hasło')
-    repair_parser.add_argument('--server', help='Serwer IMAP')
-    repair_parser.add_argument('--folder', default='INBOX', help='Folder do naprawy')
-    repair_parser.add_argument('--dry-run', action='store_true', help='Tryb testowy (bez zmian)')
-    repair_parser.add_argument('--force', action='store_true', help='Wymusza naprawę bez potwierdzenia')
-    
-    # === llmass test ===
-    test_parser = subparsers.add_parser(
-        'test',
-        help='Uruchom testy jednostkowe',
-        description='Testy funkcjonalności llmass'
-    )
-    test_parser.add_argument('--verbose', '-v', action='store_true', help='Tryb verbose')
-    test_parser.add_argument('--quick', action='store_true', help='Szybkie testy (bez integracyjnych)')
-    
-    args = parser.parse_args()
-    
-    # Wywołaj odpowiednią komendę
-    if args.command == 'generate':
-        run_generate(args)
-    elif args.command == 'clean':
-        run_clean(args)
-    elif args.command == 'write':
-        run_write(args)
-    elif args.command == 'repair':
-        run_repair(args)
-    elif args.command == 'test':
-        run_test(args)
+    if mode in _COMMANDS:
+        _build_subparser(subparsers, mode)
     else:
-        parser.print_help()
-        sys.exit(1)
+        for name in _COMMANDS:
+            _build_subparser(subparsers, name)
+    return parser
+
+
+def main():
+    """Główny entry point dla llmass CLI"""
+    # Szybka ścieżka: wersja bez budowania parsera
+    if len(sys.argv) == 2 and sys.argv[1] in ('-V', '--version', 'version'):
+        print(f"llmass {__version__}")
+        return
+
+    argv = sys.argv[1:]
+    if not argv or argv[0] in ('-h', '--help'):
+        print(_TOPLEVEL_HELP)
+        if not argv:
+            sys.exit(2)
+        return
+    command = _sniff_subcommand(argv)
+
+    # Typowe wywołanie `llmass <komenda> --flagi...` obsługujemy bez argparse
+    if command and argv[0] == command and '-h' not in argv and '--help' not in argv:
+        args = _fast_parse(command, argv[1:])
+        if args is not None:
+            _DISPATCH[command](args)
+            return
+
+    # Budujemy tylko subparser wywołanej komendy
+    args = _get_parser(command or _ALL_COMMANDS).parse_args(argv)
+    
+    # Wywołaj odpowiednią komendę (subparsers ma required=True, więc komenda zawsze jest znana)
+    _DISPATCH[args.command](args)
+
+
+def _print_error(message: str):
+    """Wypisuje błąd z ❌ na konsolach UTF-8, a z prefiksem ASCII [ERROR] na pozostałych (np. cp1250)."""
+    encoding = (getattr(sys.stdout, 'encoding', None) or '').lower().replace('-', '')
+    print(f"❌ {message}" if encoding.startswith('utf') else f"[ERROR] {message}")
+
+
+def _exit_now(rc: int = 0):
+    """Kończy proces z pominięciem sprzątania interpretera (finalizery torch/transformers/sklearn).
+
+    Nie działa w trybie interaktywnym (python -i), gdzie użytkownik chce wrócić do REPL.
+    """
+    if sys.flags.interactive:
+        return
+    if 'logging' in sys.modules:
+        sys.modules['logging'].shutdown()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(rc)
 
 
 def run_clean(args):
@@ -127,126 +255,91 @@ def run_clean(args):
     try:
         from llmass.organizer.app import run_clean_from_args
     except Exception as e:
-        print(f"❌ Nie można uruchomić modułowego organizera: {e}")
+        _print_error(f"Nie można uruchomić modułowego organizera: {e}")
         sys.exit(1)
 
-    run_clean_from_args(args)
+    _exit_now(run_clean_from_args(args) or 0)
+
+
+def _options(args, exclude=('command',)) -> dict:
+    """Opcje z Namespace bez wartości niepodanych (None) - moduły docelowe uzupełniają je z .env/domyślnych."""
+    return {k: v for k, v in vars(args).items() if v is not None and k not in exclude}
 
 
 def run_write(args):
     """Uruchom email responder"""
     try:
-        from email_responder import main as responder_main
+        from email_responder import run as responder_run
     except ImportError:
-        print("❌ Nie można zaimportować email_responder")
+        _print_error("Nie można zaimportować email_responder")
         sys.exit(1)
     
-    # Przekaż argumenty do email_responder
-    sys.argv = ['email_responder']
-    if args.email:
-        sys.argv.extend(['--email', args.email])
-    if args.password:
-        sys.argv.extend(['--password', args.password])
-    if args.server:
-        sys.argv.extend(['--server', args.server])
-    if args.smtp:
-        sys.argv.extend(['--smtp', args.smtp])
-    if args.model:
-        sys.argv.extend(['--model', args.model])
-    if args.folder:
-        sys.argv.extend(['--folder', args.folder])
-    if args.limit:
-        sys.argv.extend(['--limit', str(args.limit)])
-    if args.since_days:
-        sys.argv.extend(['--since-days', str(args.since_days)])
-    if args.since_date:
-        sys.argv.extend(['--since-date', args.since_date])
-    if args.all_emails:
-        sys.argv.append('--all-emails')
-    if args.dry_run:
-        sys.argv.append('--dry-run')
-    if args.temperature:
-        sys.argv.extend(['--temperature', str(args.temperature)])
-    if args.max_tokens:
-        sys.argv.extend(['--max-tokens', str(args.max_tokens)])
-    if args.offline:
-        sys.argv.append('--offline')
-    
-    responder_main()
+    _exit_now(responder_run(_options(args)) or 0)
+
+
+# Opcje `llmass generate` -> nazwy opcji email_generator.run()
+_GENERATE_PASSTHROUGH = (
+    ('smtp_host', 'host'),
+    ('smtp_port', 'port'),
+    ('num_emails', 'count'),
+    ('spam_ratio', 'spam_ratio'),
+)
 
 
 def run_generate(args):
     """Uruchom generator emaili"""
     try:
-        from email_generator import main as generator_main
+        from email_generator import run as generator_run
     except ImportError:
-        print("❌ Nie można zaimportować email_generator")
+        _print_error("Nie można zaimportować email_generator")
         sys.exit(1)
     
-    # Przekaż argumenty do email_generator
-    sys.argv = ['email_generator']
-    if args.smtp_host:
-        sys.argv.extend(['--smtp-host', args.smtp_host])
-    if args.smtp_port:
-        sys.argv.extend(['--smtp-port', str(args.smtp_port)])
-    if args.num_emails:
-        sys.argv.extend(['--num-emails', str(args.num_emails)])
-    if args.spam_ratio:
-        sys.argv.extend(['--spam-ratio', str(args.spam_ratio)])
-    if args.to:
-        sys.argv.extend(['--to', args.to])
-    
-    generator_main()
+    values = ((target, getattr(args, attr, None)) for attr, target in _GENERATE_PASSTHROUGH)
+    generator_run({target: value for target, value in values if value is not None})
 
 
 def run_repair(args):
     """Uruchom naprawę corruption IMAP"""
     try:
-        from email_organizer import main as organizer_main
-        import sys
-        
-        # Przekaż argumenty do email_organizer
-        original_argv = sys.argv.copy()
-        sys.argv = ['email_organizer', '--repair']
-        
-        if args.email:
-            sys.argv.extend(['--email', args.email])
-        if args.password:
-            sys.argv.extend(['--password', args.password])
-        if args.server:
-            sys.argv.extend(['--server', args.server])
-        if args.folder:
-            sys.argv.extend(['--folder', args.folder])
-        if args.dry_run:
-            sys.argv.append('--dry-run')
-        if args.force:
-            sys.argv.append('--force')
-        
-        organizer_main()
-        
+        from email_organizer import run as organizer_run
+        organizer_run({**_options(args), 'repair': True})
     except Exception as e:
-        print(f"❌ Błąd podczas naprawy: {e}")
+        _print_error(f"Błąd podczas naprawy: {e}")
         sys.exit(1)
-    finally:
-        sys.argv = original_argv
 
 
 def run_test(args):
     """Uruchom testy"""
-    try:
-        import pytest
-    except ImportError:
-        print("❌ pytest nie jest zainstalowany. Zainstaluj: pip install pytest")
-        sys.exit(1)
-    
-    pytest_args = ['test_suite.py']
+    # Argumenty i plik testów sprawdzamy przed importem pytest (ładowanie pluginów jest kosztowne)
+    suite = 'test_suite.py'
+    if not os.path.isfile(suite):
+        suite = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_suite.py')
+        if not os.path.isfile(suite):
+            _print_error("Nie znaleziono test_suite.py")
+            sys.exit(1)
+    pytest_args = [suite]
     if args.verbose:
         pytest_args.append('-v')
     if args.quick:
         pytest_args.extend(['-m', 'not slow'])
+
+    try:
+        import pytest
+    except ImportError:
+        _print_error("pytest nie jest zainstalowany. Zainstaluj: pip install pytest")
+        sys.exit(1)
     
     sys.exit(pytest.main(pytest_args))
 
 
+_DISPATCH = {
+    'generate': run_generate,
+    'clean': run_clean,
+    'write': run_write,
+    'repair': run_repair,
+    'test': run_test,
+}
+
+
 if __name__ == '__main__':
     main()
@@ -268,9 +268,8 @@ generate_report() {
         info "Coverage report: test-results/coverage/index.html"
     fi
     
-    if [ -f test-results/performance_metrics.json ]; then
-        info "Performance metrics saved"
-        cat test-results/performance_metrics.json | python -m json.tool
+    if [ -f test-results/benchmark.json ]; then
+        info "Benchmark results: test-results/benchmark.json"
     fi
 }
 
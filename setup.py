@@ -1,7 +1,17 @@
+import sys
+
 from setuptools import setup, find_packages
 
-with open("README.md", "r", encoding="utf-8") as fh:
-    long_description = fh.read()
+# Komendy, których metadane zawierają long_description; pozostałe (np. --version) nie czytają README
+_METADATA_COMMANDS = {"egg_info", "dist_info", "sdist", "bdist", "bdist_wheel", "build", "install", "develop"}
+
+
+def _read_readme():
+    with open("README.md", "r", encoding="utf-8") as fh:
+        return fh.read()
+
+
+long_description = _read_readme() if _METADATA_COMMANDS.intersection(sys.argv[1:]) else ""
 
 setup(
     name="llmass",
@@ -40,6 +50,14 @@ setup(
         "dev": [
             "pytest>=7.0.0",
             "pytest-cov>=4.0.0",
+            "pytest-xdist>=3.0.0",
+            "pytest-benchmark>=4.0.0",
+        ],
+        "fast": [
+            "fast_mail_parser>=0.2.5",
+        ],
+        "async": [
+            "aioimaplib>=1.0.0",
         ],
     },
     python_requires=">=3.8",
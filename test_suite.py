@@ -7,36 +7,316 @@ import pytest
 import imaplib
 import smtplib
 import time
-import json
+import glob
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from collections import Counter
 from datetime import datetime
+from unittest.mock import MagicMock
 import sys
 import os
-from typing import Dict, List, Tuple
-from colorama import init, Fore, Back, Style
+import shutil
+import subprocess
+from typing import Dict, List, Optional, Tuple
 
 # Import botów
 sys.path.append('/app')
 from email_organizer import EmailOrganizer
 from email_generator import TestEmailGenerator
+from llmass.imap.seqset import to_sequence_set
 
 # Conditional import dla EmailResponder (może nie mieć LLM dependencies)
 try:
-    from email_responder import EmailResponder
+    from email_responder import EmailResponder, TRANSFORMERS_AVAILABLE as LLM_AVAILABLE
     EMAIL_RESPONDER_AVAILABLE = True
 except ImportError as e:
     print(f"⚠️  EmailResponder nie jest dostępny: {e}")
     EmailResponder = None
     EMAIL_RESPONDER_AVAILABLE = False
+    LLM_AVAILABLE = False
 
-init(autoreset=True)
+# Opcjonalnie: równoległe uruchamianie testów (pip install pytest-xdist)
+try:
+    import xdist  # noqa: F401
+    XDIST_AVAILABLE = True
+except ImportError:
+    XDIST_AVAILABLE = False
+
+# Opcjonalnie: mikro-benchmarki (pip install pytest-benchmark)
+try:
+    import pytest_benchmark  # noqa: F401
+    BENCHMARK_AVAILABLE = True
+except ImportError:
+    BENCHMARK_AVAILABLE = False
+
+class _NoColor:
+    """Zastępuje Fore/Back/Style poza terminalem - kody ANSI stają się pustymi napisami."""
+    def __getattr__(self, name: str) -> str:
+        return ''
+
+
+# Kolory tylko na terminalu (workery xdist i CI piszą do potoku)
+if sys.stdout.isatty():
+    from colorama import init, Fore, Back, Style
+    init(autoreset=True)
+else:
+    Fore = Back = Style = _NoColor()
+
+# Wspólna sesja HTTP dla MailHog API - keep-alive zamiast nowego połączenia TCP na każde zapytanie;
+# krótkie ponowienia przy zerwanym połączeniu (np. MailHog jeszcze startuje)
+_HTTP = requests.Session()
+_HTTP.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4,
+                                   max_retries=Retry(total=3, backoff_factor=0.1)))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _close_http_session():
+    """Zamyka wspólną sesję HTTP po zakończeniu testów."""
+    yield
+    _HTTP.close()
+
+
+def wait_until(predicate, timeout: float = 5.0, interval: float = 0.05) -> bool:
+    """Odpytuje predicate() aż zwróci prawdę lub minie timeout (interwał rośnie do 0.5 s); False przy timeoucie."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+        interval = min(interval * 2, 0.5)
+    return True
+
+
+@pytest.fixture(scope="session")
+def http():
+    """Wspólna sesja HTTP (keep-alive) dla zapytań do MailHog API."""
+    return _HTTP
+
+
+# Banery testów wypisywane tylko poza trybem -q (ustawiane z konfiguracji pytest na starcie sesji)
+_BANNERS = True
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _banner_verbosity(request):
+    """Wyłącza banery print_* dla `pytest -q`."""
+    global _BANNERS
+    _BANNERS = request.config.getoption('verbose', 0) >= 0
+
+
+# Przypadki testowe współdzielone przez parametryzowane testy (pod xdist każdy przypadek może trafić do innego workera)
+SPAM_CASES = [
+    pytest.param({
+        'subject': 'VIAGRA 80% OFF!!! LIMITED TIME!!!',
+        'from': 'pharmacy123@cheapmeds.net',
+        'body': 'Buy cheap VIAGRA now! No prescription needed! Click here!!!'
+    }, True, id='spam'),
+    pytest.param({
+        'subject': 'Meeting tomorrow at 10am',
+        'from': 'boss@company.com',
+        'body': 'Please prepare the quarterly report for tomorrow\'s meeting.'
+    }, False, id='normal'),
+]
+
+TEST_EMAIL_SETS = [
+    {'subject': 'Project Alpha update', 'body': 'Here is the latest update on Project Alpha'},
+    {'subject': 'Project Alpha deadline', 'body': 'Reminder about Project Alpha deadline'},
+    {'subject': 'Project Alpha meeting', 'body': 'Let\'s discuss Project Alpha tomorrow'},
+    {'subject': 'Order confirmed #12345', 'body': 'Your order has been shipped'},
+    {'subject': 'Order update #12346', 'body': 'Your order is being processed'},
+    {'subject': 'Newsletter December', 'body': 'Monthly newsletter content'},
+]
+
+
+def make_fake_imap(folders: Optional[List[str]] = None, delim: str = '.', **side_effects) -> MagicMock:
+    """MagicMock(spec=imaplib.IMAP4): operacje na folderach zwracają OK, side_effects nadpisują wybrane metody.
+
+    folders: nazwy zwracane przez LIST/LSUB (FolderManager czyta je przez _load_list, nie przez get_folders).
+    """
+    imap = MagicMock(spec=imaplib.IMAP4)
+    for name in ('select', 'uid', 'create', 'subscribe', 'unsubscribe', 'delete', 'rename', 'status'):
+        getattr(imap, name).return_value = ('OK', [b''])
+    if folders is not None:
+        lines = [f'(\\HasNoChildren) "{delim}" "{name}"'.encode() for name in folders]
+        imap.list.return_value = ('OK', lines)
+        imap.lsub.return_value = ('OK', lines)
+    for name, effect in side_effects.items():
+        getattr(imap, name).side_effect = effect
+    return imap
+
+
+class FakeMailServer:
+    """Serwer pocztowy w pamięci: skrzynki IMAP (dict) + odbiór SMTP, synchronicznie i bez sieci.
+
+    imap() i smtp() zwracają fabryki podstawiane monkeypatchem za imaplib.IMAP4_SSL / smtplib.SMTP.
+    """
+
+    def __init__(self, delim: str = '.'):
+        self.delim = delim
+        self.mailboxes: Dict[str, List[Tuple[int, bytes]]] = {'INBOX': []}
+        self.subscribed = {'INBOX'}
+        self.sent: List[bytes] = []
+        self._next_uid = 1
+
+    def deliver(self, raw: bytes, mailbox: str = 'INBOX'):
+        self.mailboxes.setdefault(mailbox, []).append((self._next_uid, raw))
+        self._next_uid += 1
+
+    def imap(self):
+        return lambda host, *args, **kwargs: _FakeIMAP(self)
+
+    def smtp(self):
+        return lambda host=None, port=None, *args, **kwargs: _FakeSMTP(self)
+
+
+class _FakeSMTP:
+    def __init__(self, server: FakeMailServer):
+        self.server = server
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def ehlo(self, *args):
+        return (250, b'OK')
+
+    def send_message(self, msg, *args, **kwargs):
+        raw = msg.as_bytes()
+        self.server.sent.append(raw)
+        self.server.deliver(raw)
+        return {}
+
+    def quit(self):
+        return (221, b'Bye')
+
+
+class _FakeIMAP:
+    """Podzbiór imaplib.IMAP4 z odpowiedziami w formacie imaplib (stan w FakeMailServer)."""
+
+    def __init__(self, server: FakeMailServer):
+        self.server = server
+        self.selected: Optional[str] = None
+
+    @staticmethod
+    def _name(mailbox) -> str:
+        name = mailbox.decode() if isinstance(mailbox, (bytes, bytearray)) else str(mailbox)
+        return name[1:-1] if len(name) >= 2 and name[0] == name[-1] == '"' else name
+
+    def _messages(self) -> List[Tuple[int, bytes]]:
+        return self.server.mailboxes.get(self.selected or '', [])
+
+    def login(self, user, password):
+        return ('OK', [b'Logged in'])
+
+    def logout(self):
+        return ('BYE', [b'Logging out'])
+
+    def noop(self):
+        return ('OK', [b'NOOP completed'])
+
+    def capability(self):
+        return ('OK', [b'IMAP4rev1'])
+
+    def list(self, directory='', pattern='*'):
+        return ('OK', [f'(\\HasNoChildren) "{self.server.delim}" "{n}"'.encode() for n in self.server.mailboxes])
+
+    def lsub(self, directory='', pattern='*'):
+        return ('OK', [f'() "{self.server.delim}" "{n}"'.encode() for n in self.server.mailboxes if n in self.server.subscribed])
+
+    def select(self, mailbox='INBOX', readonly=False):
+        name = self._name(mailbox)
+        if name not in self.server.mailboxes:
+            return ('NO', [b'Mailbox does not exist'])
+        self.selected = name
+        return ('OK', [str(len(self._messages())).encode()])
+
+    def close(self):
+        self.selected = None
+        return ('OK', [b''])
+
+    def expunge(self):
+        return ('OK', [None])
+
+    def status(self, mailbox, names):
+        name = self._name(mailbox)
+        if name not in self.server.mailboxes:
+            return ('NO', [b'Mailbox does not exist'])
+        return ('OK', [f'"{name}" (MESSAGES {len(self.server.mailboxes[name])})'.encode()])
+
+    def create(self, mailbox):
+        self.server.mailboxes.setdefault(self._name(mailbox), [])
+        return ('OK', [b''])
+
+    def delete(self, mailbox):
+        self.server.mailboxes.pop(self._name(mailbox), None)
+        return ('OK', [b''])
+
+    def rename(self, old, new):
+        self.server.mailboxes[self._name(new)] = self.server.mailboxes.pop(self._name(old), [])
+        return ('OK', [b''])
+
+    def subscribe(self, mailbox):
+        self.server.subscribed.add(self._name(mailbox))
+        return ('OK', [b''])
+
+    def unsubscribe(self, mailbox):
+        self.server.subscribed.discard(self._name(mailbox))
+        return ('OK', [b''])
+
+    def search(self, charset, *criteria):
+        return ('OK', [' '.join(str(i) for i in range(1, len(self._messages()) + 1)).encode()])
+
+    def fetch(self, message_set, parts):
+        ids = message_set.decode() if isinstance(message_set, (bytes, bytearray)) else str(message_set)
+        wanted = {int(n) for part in ids.split(',') for n in range(int(part.split(':')[0]), int(part.split(':')[-1]) + 1)}
+        data = []
+        for seq, (_uid, raw) in enumerate(self._messages(), 1):
+            if seq in wanted:
+                data += [(f'{seq} (RFC822 {{{len(raw)}}}'.encode(), raw), b')']
+        return ('OK', data)
+
+    def uid(self, command, *args):
+        if command.upper() == 'SEARCH':
+            return ('OK', [' '.join(str(u) for u, _raw in self._messages()).encode()])
+        return ('NO', [f'UID {command} not supported by fake'.encode()])
+
+
+class _TestOutput:
+    """Helpery wypisywania banerów testów."""
 
-class TestEmailBots:
-    """Klasa testująca boty email"""
+    def print_test_header(self, test_name: str):
+        """Wyświetla nagłówek testu (jeden zapis na stdout)"""
+        if _BANNERS:
+            sys.stdout.write(f"\n{Fore.CYAN}{'='*60}\n{Fore.YELLOW}🧪 TEST: {test_name}\n{Fore.CYAN}{'='*60}\n")
+
+    def print_success(self, message: str):
+        """Wyświetla sukces"""
+        if _BANNERS:
+            sys.stdout.write(f"{Fore.GREEN}✅ {message}\n")
+
+    def print_error(self, message: str):
+        """Wyświetla błąd (także w trybie -q)"""
+        sys.stdout.write(f"{Fore.RED}❌ {message}\n")
+
+    def print_info(self, message: str):
+        """Wyświetla informację"""
+        if _BANNERS:
+            sys.stdout.write(f"{Fore.BLUE}ℹ️  {message}\n")
+
+
+class _EmailBotsTestBase(_TestOutput):
+    """Wspólne fixtures dla klas testowych.
+
+    Fixtures o zasięgu class tworzone są osobno dla każdej klasy pochodnej (i każdego workera xdist);
+    test_config, email_generator i respondery mają zasięg session - model LLM wczytywany najwyżej raz na proces.
+    """
     
-    @pytest.fixture(scope="class")
+    @pytest.fixture(scope="session")
     def test_config(self):
         """Konfiguracja testowa"""
         return {
@@ -45,17 +325,20 @@ class TestEmailBots:
             'imap_server': os.environ.get('IMAP_SERVER', 'dovecot'),
             'smtp_server': os.environ.get('SMTP_SERVER', 'mailhog'),
             'mailhog_api': os.environ.get('MAILHOG_API', 'http://mailhog:8025'),
-            'model': 'microsoft/DialoGPT-small'  # Mały model dla testów
+            # Malutki GPT-2 (~1 MB wag) - testy sprawdzają ścieżkę kodu, nie jakość odpowiedzi
+            'model': os.environ.get('TEST_MODEL', 'sshleifer/tiny-gpt2'),
+            # HF_LOCAL_FILES_ONLY=1: model tylko z cache HF_HOME, bez sieci
+            'local_files_only': os.environ.get('HF_LOCAL_FILES_ONLY') == '1',
         }
-    
-    @pytest.fixture(scope="class")
+
+    @pytest.fixture(scope="session")
     def email_generator(self, test_config):
         """Fixture dla generatora emaili"""
         return TestEmailGenerator(
             smtp_host=test_config['smtp_server'],
             smtp_port=1025
         )
-    
+
     @pytest.fixture(scope="class")
     def organizer_bot(self, test_config):
         """Fixture dla bota organizującego"""
@@ -64,10 +347,10 @@ class TestEmailBots:
             password=test_config['password'],
             imap_server=test_config['imap_server']
         )
-    
-    @pytest.fixture(scope="class")
+
+    @pytest.fixture(scope="session")
     def responder_bot(self, test_config):
-        """Fixture dla bota odpowiadającego"""
+        """Fixture dla bota odpowiadającego - jeden na sesję, model ładowany leniwie i trzymany w pamięci"""
         if not EMAIL_RESPONDER_AVAILABLE:
             pytest.skip("EmailResponder not available (missing LLM dependencies)")
             
@@ -78,253 +361,27 @@ class TestEmailBots:
             imap_server=test_config['imap_server'],
             smtp_server=test_config['smtp_server']
         )
-    
-    def print_test_header(self, test_name: str):
-        """Wyświetla nagłówek testu"""
-        print(f"\n{Fore.CYAN}{'='*60}")
-        print(f"{Fore.YELLOW}🧪 TEST: {test_name}")
-        print(f"{Fore.CYAN}{'='*60}")
-    
-    def print_success(self, message: str):
-        """Wyświetla sukces"""
-        print(f"{Fore.GREEN}✅ {message}")
-    
-    def print_error(self, message: str):
-        """Wyświetla błąd"""
-        print(f"{Fore.RED}❌ {message}")
-    
-    def print_info(self, message: str):
-        """Wyświetla informację"""
-        print(f"{Fore.BLUE}ℹ️  {message}")
-    
-    def test_environment_setup(self, test_config):
-        """Test 1: Sprawdzenie środowiska"""
-        self.print_test_header("Environment Setup")
-        
-        # Sprawdź zmienne środowiskowe
-        assert test_config['email'] is not None, "EMAIL_ADDRESS not set"
-        assert test_config['password'] is not None, "EMAIL_PASSWORD not set"
-        self.print_success("Environment variables configured")
-        
-        # Sprawdź dostępność MailHog API
-        try:
-            response = requests.get(f"{test_config['mailhog_api']}/api/v2/messages")
-            assert response.status_code == 200, f"MailHog API not accessible"
-            self.print_success(f"MailHog API accessible at {test_config['mailhog_api']}")
-        except Exception as e:
-            self.print_error(f"MailHog API error: {e}")
-            pytest.fail(str(e))
-    
-    def test_email_generation(self, email_generator):
-        """Test 2: Generowanie testowych emaili"""
-        self.print_test_header("Email Generation")
-        
-        # Generuj małą partię do testu
-        email_generator.generate_batch(num_emails=20, spam_ratio=0.3)
-        
-        assert len(email_generator.generated_emails) == 20, "Wrong number of emails generated"
-        self.print_success(f"Generated {len(email_generator.generated_emails)} test emails")
-        
-        # Sprawdź rozkład kategorii
-        categories = {}
-        spam_count = 0
-        for email in email_generator.generated_emails:
-            cat = email['category']
-            categories[cat] = categories.get(cat, 0) + 1
-            if email['is_spam']:
-                spam_count += 1
-        
-        self.print_info("Email categories distribution:")
-        for cat, count in categories.items():
-            print(f"  • {cat}: {count}")
-        
-        assert spam_count == 6, f"Expected 6 spam emails, got {spam_count}"
-        self.print_success(f"Spam ratio correct: {spam_count}/20")
-    
-    def test_email_sending(self, email_generator, test_config):
-        """Test 3: Wysyłanie emaili do serwera testowego"""
-        self.print_test_header("Email Sending")
-        
-        # Wyślij emaile
-        sent, failed = email_generator.send_all_emails(delay=0.05)
-        
-        assert sent > 0, "No emails were sent"
-        assert failed == 0, f"Failed to send {failed} emails"
-        self.print_success(f"Successfully sent {sent} emails")
-        
-        # Sprawdź czy emaile dotarły do MailHog
-        time.sleep(2)  # Czekaj na przetworzenie
-        
-        response = requests.get(f"{test_config['mailhog_api']}/api/v2/messages")
-        messages = response.json()
-        
-        assert messages['count'] >= sent, f"Not all emails arrived to MailHog"
-        self.print_success(f"MailHog received {messages['count']} messages")
-    
-    def test_imap_connection(self, organizer_bot):
-        """Test 4: Połączenie IMAP"""
-        self.print_test_header("IMAP Connection")
-        
-        connected = organizer_bot.connect()
-        assert connected, "Failed to connect to IMAP server"
-        self.print_success(f"Connected to IMAP server: {organizer_bot.imap_server}")
-        
-        # Sprawdź foldery
-        folders = organizer_bot.get_folders()
-        assert len(folders) > 0, "No folders found"
-        self.print_info(f"Found {len(folders)} folders: {', '.join(folders[:5])}")
-        
-        # Sprawdź INBOX
-        organizer_bot.imap.select("INBOX")
-        result, data = organizer_bot.imap.search(None, "ALL")
-        assert result == 'OK', "Failed to search INBOX"
-        
-        email_count = len(data[0].split()) if data[0] else 0
-        self.print_success(f"INBOX contains {email_count} emails")
-        
-        organizer_bot.disconnect()
-
-    def test_imap_list_parsing(self, organizer_bot):
-        """Test: Parsowanie IMAP LIST"""
-        self.print_test_header("IMAP LIST Parsing")
-        
-        organizer_bot.connect()
-        try:
-            folders = organizer_bot.get_folders()
-            assert len(folders) > 0, "No folders parsed from LIST"
-            assert not any(f.strip() in ('.', '..') for f in folders), "LIST parsing returned dot placeholders"
-            assert any('inbox' in f.lower() for f in folders), "INBOX not found in folders"
-            self.print_success("LIST parsing returned proper folder names")
-        finally:
-            organizer_bot.disconnect()
-
-    def test_parse_list_line_samples(self, organizer_bot):
-        """Test: Parser LIST radzi sobie z typowymi odpowiedziami."""
-        self.print_test_header("LIST Line Parsing Samples")
-        samples = [
-            b"(\\HasNoChildren) \".\" \"INBOX.Sent\"",
-            b"(\\HasChildren) \"/\" INBOX",
-            b"(\\Noselect \\HasChildren) \"/\" \"[Gmail]\"",
-        ]
-        for raw in samples:
-            flags, delim, name = organizer_bot._parse_list_line(raw)
-            assert delim in ('.', '/', '')
-            assert isinstance(name, str) and len(name) > 0
-        self.print_success("LIST parser handles common formats")
-
-    def test_encode_and_resolve_category_names(self, organizer_bot):
-        """Test: Sanitizacja nazw kategorii i osadzenie pod INBOX."""
-        self.print_test_header("Category Name Sanitization")
-        organizer_bot._get_hierarchy_delimiter = lambda: '.'
-        # Diakrytyki i delimiter w nazwie
-        resolved = organizer_bot._resolve_category_folder_name('Category_Powiąż.test')
-        assert resolved.startswith('INBOX.')
-        assert 'Powiaz' in resolved and '_test' in resolved
-        # Już pełna ścieżka
-        resolved2 = organizer_bot._resolve_category_folder_name('INBOX.Category_Zapytanie')
-        assert resolved2 == 'INBOX.Category_Zapytanie'
-        self.print_success("Category names are sanitized and placed under INBOX")
 
-    def test_choose_existing_category_folder_mocked(self, organizer_bot):
-        """Test: Dopasowanie do istniejących folderów kategorii po treści/nadawcy."""
-        self.print_test_header("Existing Category Matching")
-        # Cluster emails
-        cluster_emails = [
-            {'subject': 'Dialogplan project update', 'body': 'Dialogplan summary', 'from': 'info@dialogplan.com'},
-            {'subject': 'Dialogplan meeting', 'body': 'Agenda', 'from': 'support@dialogplan.com'},
-        ]
-        # Mock candidates and folder messages
-        organizer_bot._list_category_folders = lambda: ['INBOX.Category_Dialogplan_com', 'INBOX.Category_Www']
-        def _fetch(folder, limit):
-            if folder == 'INBOX.Category_Dialogplan_com':
-                return [
-                    {'subject': 'Dialogplan invoice', 'body': 'Payment details', 'from': 'billing@dialogplan.com'},
-                    {'subject': 'Dialogplan news', 'body': 'Update', 'from': 'news@dialogplan.com'},
-                ]
-            return [
-                {'subject': 'WWW changes', 'body': 'site update', 'from': 'web@host.com'}
-            ]
-        organizer_bot._fetch_messages_from_folder = _fetch
-        organizer_bot.category_match_similarity = 0.2
-        organizer_bot.category_sender_weight = 0.1
-        organizer_bot.category_sample_limit = 10
-        best = organizer_bot._choose_existing_category_folder(cluster_emails)
-        assert best == 'INBOX.Category_Dialogplan_com'
-        self.print_success("Existing folder matched correctly")
+    @pytest.fixture(scope="session")
+    def loaded_responder_bot(self, responder_bot, test_config):
+        """Responder z modelem wczytanym dokładnie raz na sesję (mock, gdy model niedostępny)"""
+        responder_bot.load_model(local_files_only=test_config['local_files_only'])
+        return responder_bot
 
-    def test_cross_spam_similarity_mocked(self, organizer_bot):
-        """Test: Podobieństwo do SPAM/Kosz przenosi właściwe maile."""
-        self.print_test_header("Cross-folder Spam Similarity")
-        # Prepare emails_data (INBOX)
-        emails_data = [
-            {'id': b'1', 'subject': 'Dialogplan update', 'body': 'Latest Dialogplan features'},
-            {'id': b'2', 'subject': 'General news', 'body': 'Hello world'},
-        ]
-        # Mock reference fetcher
-        organizer_bot._fetch_texts_from_folder = lambda folder, limit: ['Dialogplan announcement', 'Other content']
-        organizer_bot._find_trash_folders = lambda: []
-        organizer_bot.cross_spam_similarity = 0.3
-        uids, rm_idx = organizer_bot._mark_inbox_like_spam(emails_data, 'INBOX.SPAM')
-        assert b'1' in uids and b'2' not in uids
-        assert 0 in rm_idx and 1 not in rm_idx
-        self.print_success("Cross-folder similarity marks correct emails")
 
-    def test_cleanup_empty_category_folders_mocked(self, organizer_bot):
-        """Test: Usuwanie pustych folderów Category* działa na sucho z mockiem IMAP."""
-        self.print_test_header("Cleanup Empty Category Folders")
-        # Mock folder list and delimiter
-        organizer_bot.get_folders = lambda: [
-            'INBOX.Category_Empty',
-            'INBOX.Category_NonEmpty',
-            'INBOX.Category_WithChild',
-            'INBOX.Category_WithChild.Sub',
-            'INBOX.Other'
-        ]
-        organizer_bot._get_hierarchy_delimiter = lambda: '.'
-        class DummyImap:
-            def __init__(self):
-                self.deleted = []
-                self._selected = None
-            def select(self, name, readonly=False):
-                self._selected = name
-                return ('OK', [b''])
-            def uid(self, *args):
-                if args[0] == 'SEARCH':
-                    if self._selected.endswith('Category_Empty'):
-                        return ('OK', [b''])
-                    return ('OK', [b'1 2'])
-                return ('OK', [b''])
-            def unsubscribe(self, mailbox):
-                return ('OK', [b''])
-            def delete(self, mailbox):
-                # mailbox can be str
-                self.deleted.append(mailbox)
-                return ('OK', [b''])
-        organizer_bot.imap = DummyImap()
-        organizer_bot.cleanup_empty_categories = True
-        organizer_bot._cleanup_empty_category_folders()
-        # Ensure only the empty one was deleted
-        assert any('Category_Empty' in x for x in organizer_bot.imap.deleted)
-        assert not any('Category_NonEmpty' in x for x in organizer_bot.imap.deleted)
-        assert not any('Category_WithChild' in x and not x.endswith('Sub') for x in organizer_bot.imap.deleted)
-        self.print_success("Empty Category folders are removed, others preserved")
+@pytest.mark.unit
+class TestEmailOrganizerUnit(_TestOutput):
+    """Testy jednostkowe bez fixtures - każdy buduje własny EmailOrganizer z mockiem IMAP"""
 
     def test_migrate_unsafe_category_folders_dry_run(self):
         """Test: Migracja niebezpiecznych folderów tylko wypisuje w DRY-RUN i nie woła RENAME."""
         self.print_test_header("Migrate Unsafe Folders - DRY-RUN")
         from email_organizer import EmailOrganizer
         bot = EmailOrganizer(email_address='test@localhost', password='x', imap_server='dovecot', dry_run=True)
-        bot._get_hierarchy_delimiter = lambda: '.'
-        bot.get_folders = lambda: ['INBOX.Category_[alert]', 'INBOX.Category_Masz']
-        class DummyImap:
-            def __init__(self):
-                self.renamed = []
-            def rename(self, old, new):
-                self.renamed.append((old, new))
-                return ('OK', [b''])
-        bot.imap = DummyImap()
+        bot.imap = make_fake_imap(folders=['INBOX', 'INBOX.Category_[alert]', 'INBOX.Category_Masz'])
         bot._migrate_unsafe_category_folders()
-        assert bot.imap.renamed == []
+        bot.imap.list.assert_called()
+        bot.imap.rename.assert_not_called()
         self.print_success("DRY-RUN migration does not call RENAME")
 
     def test_migrate_unsafe_category_folders_rename(self):
@@ -332,27 +389,83 @@ class TestEmailBots:
         self.print_test_header("Migrate Unsafe Folders - Rename")
         from email_organizer import EmailOrganizer
         bot = EmailOrganizer(email_address='test@localhost', password='x', imap_server='dovecot', dry_run=False)
-        bot._get_hierarchy_delimiter = lambda: '.'
-        bot.get_folders = lambda: ['INBOX.Category_[alert]', 'INBOX.Category_Masz']
-        class DummyImap:
-            def __init__(self):
-                self.renamed = []
-                self.subscribed = []
-            def rename(self, old, new):
-                self.renamed.append((old, new))
-                return ('OK', [b''])
-            def subscribe(self, mailbox):
-                self.subscribed.append(mailbox)
-                return ('OK', [b''])
-        bot.imap = DummyImap()
+        bot.imap = make_fake_imap(folders=['INBOX', 'INBOX.Category_[alert]', 'INBOX.Category_Masz'])
         bot._migrate_unsafe_category_folders()
-        assert len(bot.imap.renamed) == 1
-        old, new = bot.imap.renamed[0]
+        assert bot.imap.rename.call_count == 1
+        old, new = bot.imap.rename.call_args.args
         assert old == 'INBOX.Category_[alert]'
         assert new == 'INBOX.Category_alert' or new.startswith('INBOX.Category_alert_')
-        assert any('Category_alert' in s if isinstance(s, str) else False for s in bot.imap.subscribed)
+        assert any('Category_alert' in c.args[0] if isinstance(c.args[0], str) else False
+                   for c in bot.imap.subscribe.call_args_list)
         self.print_success("Unsafe folder renamed and subscribed")
 
+    def test_fetch_and_filter_batched_mocked(self):
+        """Test: fetch_and_filter pobiera nagłówki i treść jednym UID FETCH na batch."""
+        self.print_test_header("Batched FETCH")
+        from email_organizer import EmailOrganizer
+        from llmass.organizer.fetcher import fetch_and_filter
+        bot = EmailOrganizer(email_address='test@localhost', password='x', imap_server='dovecot')
+        bot.fetch_batch_size = 2
+        body = 'Please review the attached document for project timeline and responsibilities.'
+        def _header(n):
+            return (f"Subject: Project update {n}\r\nFrom: boss@company.com\r\n"
+                    f"Message-ID: <m{n}@company.com>\r\n\r\n").encode()
+        def _uid(command, msg_set, parts):
+            assert 'RFC822' not in parts and 'HEADER.FIELDS' in parts
+            data = []
+            uids = [str(n) for part in msg_set.split(',') for n in range(int(part.split(':')[0]), int(part.split(':')[-1]) + 1)]
+            for i, u in enumerate(uids):
+                if u == '13':
+                    # Serwery typu Gmail zwracają UID na końcu odpowiedzi
+                    data.append((f"{i+1} (BODY[HEADER.FIELDS (SUBJECT)] {{80}}".encode(), _header(u)))
+                    data.append((b" BODY[TEXT]<0> {80}", body.encode()))
+                    data.append(f" UID {u})".encode())
+                else:
+                    data.append((f"{i+1} (UID {u} BODY[HEADER.FIELDS (SUBJECT)] {{80}}".encode(), _header(u)))
+                    data.append((b" BODY[TEXT]<0> {80}", body.encode()))
+                    data.append(b')')
+                if u == '11':
+                    # Niezamówiona odpowiedź FETCH (zmiana flag) między wiadomościami
+                    data.append(b'9 (UID 40 FLAGS (\\Seen))')
+            return ('OK', data)
+        bot.imap = make_fake_imap(uid=_uid)
+        emails_data, stats = fetch_and_filter(bot, [b'11', b'12', b'13'], 3, set())
+        assert [c.args[1] for c in bot.imap.uid.call_args_list] == ['11:12', '13']
+        assert [e['id'] for e in emails_data] == [b'11', b'12', b'13']
+        assert emails_data[2]['subject'] == 'Project update 13'
+        assert emails_data[2]['body'] == body
+        # Potok: pobieranie w tle + parsowanie w puli wątków daje ten sam wynik
+        bot.parse_workers = 2
+        bot.imap = make_fake_imap(uid=_uid)
+        piped, piped_stats = fetch_and_filter(bot, [b'11', b'12', b'13'], 3, set())
+        assert [c.args[1] for c in bot.imap.uid.call_args_list] == ['11:12', '13']
+        assert piped == emails_data and piped_stats == stats
+        self.print_success("Messages fetched in batches")
+
+    def test_parse_message_matches_stdlib(self):
+        """Test: fast_mail_parser i parser stdlib dają ten sam dict dla text/plain, multipart i text/html."""
+        self.print_test_header("Fast Parser Parity")
+        pytest.importorskip('fast_mail_parser')
+        import email as email_lib
+        from email_organizer import EmailOrganizer
+        from llmass.organizer.fetcher import _parse_message
+        bot = EmailOrganizer(email_address='test@localhost', password='x', imap_server='dovecot')
+        headers = ("Subject: Quarterly report\r\nFrom: Boss <boss@company.com>\r\n"
+                   "Date: Mon, 1 Jan 2024 10:00:00 +0000\r\nMessage-ID: <m1@company.com>\r\nMIME-Version: 1.0\r\n")
+        samples = {
+            'plain': "Content-Type: text/plain; charset=utf-8\r\n\r\nPlease prepare the report.\r\n",
+            'multipart': ('Content-Type: multipart/alternative; boundary="XX"\r\n\r\n'
+                          "--XX\r\nContent-Type: text/plain; charset=utf-8\r\n\r\nPlain part\r\n"
+                          "--XX\r\nContent-Type: text/html; charset=utf-8\r\n\r\n<p>Html part</p>\r\n--XX--\r\n"),
+            'html': "Content-Type: text/html; charset=utf-8\r\n\r\n<p>Monthly newsletter</p>\r\n",
+        }
+        for name, rest in samples.items():
+            raw = (headers + rest).encode()
+            expected = bot.get_email_content(email_lib.message_from_bytes(raw))
+            assert _parse_message(bot, raw) == expected, name
+            assert expected['body'], name
+        self.print_success("Both parsers return the same content")
+
     def test_is_spam_sender_heuristics_only(self):
         """Test: Heurystyki nadawcy same w sobie mogą dać wynik spam."""
         self.print_test_header("Sender Heuristics Spam")
@@ -378,30 +491,30 @@ class TestEmailBots:
         assert getattr(vec, 'stop_words') == 'english'
         self.print_success("Vectorizer respects ENV config")
 
+    def test_categorize_two_corpora_same_organizer(self):
+        """Test: Drugi korpus spoza słownika pierwszego jest kategoryzowany jak na świeżym organizerze."""
+        self.print_test_header("Categorize Two Corpora")
+        from email_organizer import EmailOrganizer
+        projects = [{'subject': f'Project Alpha update {i}', 'body': 'Project Alpha status and next milestones'} for i in range(3)]
+        invoices = [{'subject': f'Invoice payment due {i}', 'body': 'Invoice payment reminder for your account'} for i in range(3)]
+        bot = EmailOrganizer(email_address='test@localhost', password='x', imap_server='dovecot')
+        assert bot.categorize_emails(projects) == {'Category_Project': [0, 1, 2]}
+        fresh = EmailOrganizer(email_address='test@localhost', password='x', imap_server='dovecot')
+        assert bot.categorize_emails(invoices) == fresh.categorize_emails(invoices) == {'Category_Invoice': [0, 1, 2]}
+        self.print_success("Vocabulary is refitted when it does not cover the new corpus")
+
     def test_dry_run_behavior(self):
         """Test: Dry-run nie wywołuje operacji IMAP i zwraca prawdę dla move."""
         self.print_test_header("Dry-run Behaviour")
         from email_organizer import EmailOrganizer
         bot = EmailOrganizer(email_address='test@localhost', password='x', imap_server='dovecot', dry_run=True)
-        class DummyImap:
-            def __init__(self):
-                self.created = []
-                self.subscribed = []
-                self.moved = []
-            def create(self, m):
-                self.created.append(m)
-                return ('OK', [b''])
-            def subscribe(self, m):
-                self.subscribed.append(m)
-                return ('OK', [b''])
-            def uid(self, *args):
-                self.moved.append(args)
-                return ('OK', [b''])
-        bot.imap = DummyImap()
+        bot.imap = make_fake_imap()
         bot.create_folder('INBOX.Category_Test')  # dry-run: no create
         ok = bot.move_email(b'1', 'INBOX.Category_Test')
         assert ok is True
-        assert bot.imap.created == [] and bot.imap.subscribed == [] and bot.imap.moved == []
+        bot.imap.create.assert_not_called()
+        bot.imap.subscribe.assert_not_called()
+        bot.imap.uid.assert_not_called()
         self.print_success("Dry-run avoids IMAP side-effects")
 
     def test_content_sufficiency_helper(self, monkeypatch):
@@ -427,47 +540,182 @@ class TestEmailBots:
         assert bot._has_sufficient_text(low_text) is False
         assert bot._has_sufficient_text(rich_text) is True
         self.print_success("Content sufficiency thresholds respected")
-    
-    def test_spam_detection(self, organizer_bot):
+
+    def test_cli_help_skips_heavy_imports(self):
+        """Test: `llmass clean --help` nie importuje modułów organizera (numpy/sklearn)."""
+        self.print_test_header("CLI Help Without Heavy Imports")
+        code = (
+            "import sys, llmass_cli\n"
+            "sys.argv = ['llmass', 'clean', '--help']\n"
+            "try:\n"
+            "    llmass_cli.main()\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print(sorted(m for m in ('email_organizer', 'llmass.organizer.app', 'sklearn') if m in sys.modules))\n"
+        )
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        assert out.returncode == 0, out.stderr
+        assert out.stdout.strip().splitlines()[-1] == '[]'
+        self.print_success("Subcommand help stays lightweight")
+
+
+@pytest.mark.unit
+class TestEmailBotsFake(_TestOutput):
+    """Ścieżki IMAP/SMTP botów na serwerze w pamięci (FakeMailServer) - bez Dovecot/MailHog i bez czekania"""
+
+    @pytest.fixture
+    def fake_mail(self, monkeypatch):
+        server = FakeMailServer()
+        monkeypatch.setattr('llmass.imap.session.imaplib.IMAP4_SSL', server.imap())
+        monkeypatch.setattr('email_generator.smtplib.SMTP', server.smtp())
+        return server
+
+    def test_email_sending_fake(self, fake_mail):
+        """Test: Wysłane emaile trafiają od razu do INBOX (bez sleep/polling)."""
+        self.print_test_header("Email Sending (fake server)")
+        generator = TestEmailGenerator(smtp_host='fake', smtp_port=1025)
+        generator.generate_batch(num_emails=5, spam_ratio=0.2)
+        sent, failed = generator.send_all_emails_pooled(delay=0)
+        assert (sent, failed) == (5, 0)
+        assert len(fake_mail.sent) == 5 and len(fake_mail.mailboxes['INBOX']) == 5
+        self.print_success("Emails delivered to the in-memory INBOX")
+
+    def test_imap_connection_fake(self, fake_mail):
+        """Test: connect/LIST/SELECT/SEARCH organizera na serwerze w pamięci."""
+        self.print_test_header("IMAP Connection (fake server)")
+        fake_mail.mailboxes['INBOX.Spam'] = []
+        for n in range(3):
+            fake_mail.deliver(f"Subject: Hello {n}\r\nFrom: a@b.com\r\n\r\nBody {n}".encode())
+        bot = EmailOrganizer(email_address='test@localhost', password='x', imap_server='fake')
+        assert bot.connect()
+        assert set(bot.get_folders()) == {'INBOX', 'INBOX.Spam'}
+        assert bot.get_folders(subscribed_only=True) == ['INBOX']
+        bot.imap.select("INBOX")
+        result, data = bot.imap.search(None, "ALL")
+        assert result == 'OK' and len(data[0].split()) == 3
+        result, data = bot.imap.fetch(to_sequence_set(data[0].split()), "(RFC822)")
+        assert sum(1 for part in data if isinstance(part, tuple)) == 3
+        self.print_success("Organizer works against the in-memory IMAP server")
+
+
+@pytest.mark.unit
+class TestEmailBotsUnit(_EmailBotsTestBase):
+    """Testy jednostkowe na mockach (bez Dovecot/MailHog) - pod --dist=loadgroup rozdzielane między workery pojedynczo"""
+
+    def test_parse_list_line_samples(self, organizer_bot):
+        """Test: Parser LIST radzi sobie z typowymi odpowiedziami."""
+        self.print_test_header("LIST Line Parsing Samples")
+        samples = [
+            b"(\\HasNoChildren) \".\" \"INBOX.Sent\"",
+            b"(\\HasChildren) \"/\" INBOX",
+            b"(\\Noselect \\HasChildren) \"/\" \"[Gmail]\"",
+        ]
+        for raw in samples:
+            flags, delim, name = organizer_bot._parse_list_line(raw)
+            assert delim in ('.', '/', '')
+            assert isinstance(name, str) and len(name) > 0
+        self.print_success("LIST parser handles common formats")
+
+    def test_encode_and_resolve_category_names(self, organizer_bot, monkeypatch):
+        """Test: Sanitizacja nazw kategorii i osadzenie pod INBOX."""
+        self.print_test_header("Category Name Sanitization")
+        # FolderManager bierze delimiter z cache organizera, nie z EmailOrganizer._get_hierarchy_delimiter
+        monkeypatch.setattr(organizer_bot, '_delim_cache', '.')
+        # Diakrytyki i delimiter w nazwie
+        resolved = organizer_bot._resolve_category_folder_name('Category_Powiąż.test')
+        assert resolved.startswith('INBOX.')
+        assert 'Powiaz' in resolved and '_test' in resolved
+        # Już pełna ścieżka
+        resolved2 = organizer_bot._resolve_category_folder_name('INBOX.Category_Zapytanie')
+        assert resolved2 == 'INBOX.Category_Zapytanie'
+        self.print_success("Category names are sanitized and placed under INBOX")
+
+    def test_choose_existing_category_folder_mocked(self, organizer_bot, monkeypatch):
+        """Test: Dopasowanie do istniejących folderów kategorii po treści/nadawcy."""
+        self.print_test_header("Existing Category Matching")
+        # Cluster emails
+        cluster_emails = [
+            {'subject': 'Dialogplan project update', 'body': 'Dialogplan summary', 'from': 'info@dialogplan.com'},
+            {'subject': 'Dialogplan meeting', 'body': 'Agenda', 'from': 'support@dialogplan.com'},
+        ]
+        # Mock candidates and folder messages
+        monkeypatch.setattr(organizer_bot, '_delim_cache', None)
+        monkeypatch.setattr(organizer_bot, '_folder_cache', None)
+        monkeypatch.setattr(organizer_bot, 'imap', make_fake_imap(folders=['INBOX', 'INBOX.Category_Dialogplan_com', 'INBOX.Category_Www']))
+        def _fetch(folder, limit):
+            if folder == 'INBOX.Category_Dialogplan_com':
+                return [
+                    {'subject': 'Dialogplan invoice', 'body': 'Payment details', 'from': 'billing@dialogplan.com'},
+                    {'subject': 'Dialogplan news', 'body': 'Update', 'from': 'news@dialogplan.com'},
+                ]
+            return [
+                {'subject': 'WWW changes', 'body': 'site update', 'from': 'web@host.com'}
+            ]
+        monkeypatch.setattr(organizer_bot, '_fetch_messages_from_folder', _fetch)
+        monkeypatch.setattr(organizer_bot, 'category_match_similarity', 0.2)
+        monkeypatch.setattr(organizer_bot, 'category_sender_weight', 0.1)
+        monkeypatch.setattr(organizer_bot, 'category_sample_limit', 10)
+        best = organizer_bot._choose_existing_category_folder(cluster_emails)
+        assert best == 'INBOX.Category_Dialogplan_com'
+        self.print_success("Existing folder matched correctly")
+
+    def test_cross_spam_similarity_mocked(self, organizer_bot, monkeypatch):
+        """Test: Podobieństwo do SPAM/Kosz przenosi właściwe maile."""
+        self.print_test_header("Cross-folder Spam Similarity")
+        # Prepare emails_data (INBOX)
+        emails_data = [
+            {'id': b'1', 'subject': 'Dialogplan update', 'body': 'Latest Dialogplan features'},
+            {'id': b'2', 'subject': 'General news', 'body': 'Hello world'},
+        ]
+        # Mock reference fetcher
+        monkeypatch.setattr(organizer_bot, '_fetch_texts_from_folder', lambda folder, limit: ['Dialogplan announcement', 'Other content'])
+        monkeypatch.setattr(organizer_bot, '_find_trash_folders', lambda: [])
+        monkeypatch.setattr(organizer_bot, 'cross_spam_similarity', 0.3)
+        uids, rm_idx = organizer_bot._mark_inbox_like_spam(emails_data, 'INBOX.SPAM')
+        assert b'1' in uids and b'2' not in uids
+        assert 0 in rm_idx and 1 not in rm_idx
+        self.print_success("Cross-folder similarity marks correct emails")
+
+    def test_cleanup_empty_category_folders_mocked(self, organizer_bot, monkeypatch):
+        """Test: Usuwanie pustych folderów Category* działa na sucho z mockiem IMAP."""
+        self.print_test_header("Cleanup Empty Category Folders")
+        # Mock folder list and delimiter
+        folders = [
+            'INBOX.Category_Empty',
+            'INBOX.Category_NonEmpty',
+            'INBOX.Category_WithChild',
+            'INBOX.Category_WithChild.Sub',
+            'INBOX.Other'
+        ]
+        monkeypatch.setattr(organizer_bot, '_delim_cache', None)
+        monkeypatch.setattr(organizer_bot, '_folder_cache', None)
+        def _status(name, names):
+            count = 0 if name.endswith('Category_Empty') else 2
+            return ('OK', [f'"{name}" (MESSAGES {count})'.encode()])
+        imap = make_fake_imap(folders=folders, status=_status)
+        monkeypatch.setattr(organizer_bot, 'imap', imap)
+        monkeypatch.setattr(organizer_bot, 'cleanup_empty_categories', True)
+        organizer_bot._cleanup_empty_category_folders()
+        # Ensure only the empty one was deleted (mailbox can be str)
+        deleted = [c.args[0] for c in imap.delete.call_args_list]
+        assert any('Category_Empty' in x for x in deleted)
+        assert not any('Category_NonEmpty' in x for x in deleted)
+        assert not any('Category_WithChild' in x and not x.endswith('Sub') for x in deleted)
+        self.print_success("Empty Category folders are removed, others preserved")
+
+    @pytest.mark.parametrize("email,expected", SPAM_CASES)
+    def test_spam_detection(self, organizer_bot, email, expected):
         """Test 5: Wykrywanie spamu"""
         self.print_test_header("Spam Detection")
-        
-        # Testowe emaile
-        spam_email = {
-            'subject': 'VIAGRA 80% OFF!!! LIMITED TIME!!!',
-            'from': 'pharmacy123@cheapmeds.net',
-            'body': 'Buy cheap VIAGRA now! No prescription needed! Click here!!!'
-        }
-        
-        normal_email = {
-            'subject': 'Meeting tomorrow at 10am',
-            'from': 'boss@company.com',
-            'body': 'Please prepare the quarterly report for tomorrow\'s meeting.'
-        }
-        
-        # Test wykrywania spamu
-        is_spam = organizer_bot.is_spam(spam_email)
-        assert is_spam == True, "Failed to detect spam email"
-        self.print_success("Correctly identified spam email")
-        
-        is_spam = organizer_bot.is_spam(normal_email)
-        assert is_spam == False, "Incorrectly marked normal email as spam"
-        self.print_success("Correctly identified normal email")
-    
-    def test_email_categorization(self, organizer_bot):
+        assert organizer_bot.is_spam(email) == expected, f"is_spam() != {expected} for '{email['subject']}'"
+        self.print_success(f"Correctly identified {'spam' if expected else 'normal'} email")
+
+    @pytest.mark.parametrize("test_emails", [TEST_EMAIL_SETS], ids=['mixed'])
+    def test_email_categorization(self, organizer_bot, test_emails):
         """Test 6: Kategoryzacja emaili"""
         self.print_test_header("Email Categorization")
         
-        # Przygotuj testowe emaile
-        test_emails = [
-            {'subject': 'Project Alpha update', 'body': 'Here is the latest update on Project Alpha'},
-            {'subject': 'Project Alpha deadline', 'body': 'Reminder about Project Alpha deadline'},
-            {'subject': 'Project Alpha meeting', 'body': 'Let\'s discuss Project Alpha tomorrow'},
-            {'subject': 'Order confirmed #12345', 'body': 'Your order has been shipped'},
-            {'subject': 'Order update #12346', 'body': 'Your order is being processed'},
-            {'subject': 'Newsletter December', 'body': 'Monthly newsletter content'},
-        ]
-        
         categories = organizer_bot.categorize_emails(test_emails)
         
         assert len(categories) > 0, "No categories created"
@@ -475,56 +723,215 @@ class TestEmailBots:
         
         for cat_name, indices in categories.items():
             self.print_info(f"Category '{cat_name}': {len(indices)} emails")
-    
+
+    @pytest.mark.skipif(not BENCHMARK_AVAILABLE, reason="pytest-benchmark not installed")
+    @pytest.mark.skipif(not LLM_AVAILABLE, reason="torch/transformers not installed (EmailResponder() needs torch)")
+    def test_bench_mock_response(self, benchmark, responder_bot):
+        """Test: Benchmark generowania odpowiedzi w trybie mock"""
+        self.print_test_header("Benchmark: Mock Response")
+        test_email = {
+            'from': 'test@example.com',
+            'subject': 'Performance test',
+            'body': 'This is a performance test email.'
+        }
+        response = benchmark(responder_bot._generate_mock_response, test_email)
+        assert 'Performance test' in response
+        self.print_success("Mock response benchmarked")
+
+
+@pytest.mark.integration
+@pytest.mark.xdist_group("integration")
+class TestEmailBots(_EmailBotsTestBase):
+    """Testy integracyjne (Dovecot/MailHog/LLM); kolejność ma znaczenie (generowanie -> wysyłka), więc klasa trzyma się jednego workera"""
+
+    @pytest.fixture(scope="class")
+    def organizer_bot(self, test_config):
+        """Bot organizujący z jednym połączeniem IMAP na całą klasę (LOGIN raz, LOGOUT w teardown)"""
+        bot = EmailOrganizer(
+            email_address=test_config['email'],
+            password=test_config['password'],
+            imap_server=test_config['imap_server']
+        )
+        bot.connect()
+        yield bot
+        try:
+            bot.disconnect()
+        except Exception:
+            pass
+
+    def _ensure_connected(self, bot) -> bool:
+        """NOOP na istniejącym połączeniu; gdy zostało zerwane - łączy ponownie."""
+        if getattr(bot, 'imap', None) is not None and getattr(bot.imap, 'conn', None) is not None:
+            try:
+                typ, _ = bot.imap.noop()
+                if typ == 'OK':
+                    return True
+            except (imaplib.IMAP4.abort, imaplib.IMAP4.error, OSError):
+                pass
+        return bot.connect()
+
+    def _mailhog_count(self, api: str) -> int:
+        """Liczba wiadomości w MailHog (0 gdy API nie odpowiada)."""
+        try:
+            return int(_HTTP.get(f"{api}/api/v2/messages", params={'limit': 1}, timeout=2).json().get('count', 0))
+        except (requests.RequestException, ValueError):
+            return 0
+
+    def _wait_for_mailhog(self, api: str, expected: int, timeout: float = 5.0, interval: float = 0.05) -> int:
+        """Odpytuje MailHog aż count >= expected lub minie timeout; zwraca ostatni count."""
+        last = [0]
+
+        def _arrived() -> bool:
+            last[0] = self._mailhog_count(api)
+            return last[0] >= expected
+
+        wait_until(_arrived, timeout=timeout, interval=interval)
+        return last[0]
+
+    def test_environment_setup(self, test_config, http):
+        """Test 1: Sprawdzenie środowiska"""
+        self.print_test_header("Environment Setup")
+        
+        # Sprawdź zmienne środowiskowe
+        assert test_config['email'] is not None, "EMAIL_ADDRESS not set"
+        assert test_config['password'] is not None, "EMAIL_PASSWORD not set"
+        self.print_success("Environment variables configured")
+        
+        # Sprawdź dostępność MailHog API
+        try:
+            response = http.get(f"{test_config['mailhog_api']}/api/v2/messages", params={'limit': 1}, timeout=5)
+            assert response.status_code == 200, f"MailHog API not accessible"
+            self.print_success(f"MailHog API accessible at {test_config['mailhog_api']}")
+        except Exception as e:
+            self.print_error(f"MailHog API error: {e}")
+            pytest.fail(str(e))
+
+    def test_email_generation(self, email_generator):
+        """Test 2: Generowanie testowych emaili"""
+        self.print_test_header("Email Generation")
+        
+        # Generuj małą partię do testu
+        email_generator.generate_batch(num_emails=20, spam_ratio=0.3)
+        
+        assert len(email_generator.generated_emails) == 20, "Wrong number of emails generated"
+        self.print_success(f"Generated {len(email_generator.generated_emails)} test emails")
+        
+        # Sprawdź rozkład kategorii
+        categories = Counter(e['category'] for e in email_generator.generated_emails)
+        spam_count = sum(e['is_spam'] for e in email_generator.generated_emails)
+        
+        self.print_info("Email categories distribution:")
+        for cat, count in categories.items():
+            print(f"  • {cat}: {count}")
+        
+        assert spam_count == 6, f"Expected 6 spam emails, got {spam_count}"
+        self.print_success(f"Spam ratio correct: {spam_count}/20")
+
+    def test_email_sending(self, email_generator, test_config):
+        """Test 3: Wysyłanie emaili do serwera testowego"""
+        self.print_test_header("Email Sending")
+        
+        # Reużyj partii z test_email_generation (ten sam generator class-scope); generuj tylko gdy test uruchomiono osobno
+        if not email_generator.generated_emails:
+            email_generator.generate_batch(num_emails=20, spam_ratio=0.3)
+        
+        # Wyślij emaile
+        before = self._mailhog_count(test_config['mailhog_api'])
+        sent, failed = email_generator.send_all_emails_pooled(delay=0)
+        
+        assert sent > 0, "No emails were sent"
+        assert failed == 0, f"Failed to send {failed} emails"
+        self.print_success(f"Successfully sent {sent} emails")
+        
+        # Sprawdź czy emaile dotarły do MailHog (krótkie odpytywanie zamiast stałego sleep)
+        count = self._wait_for_mailhog(test_config['mailhog_api'], before + sent)
+        
+        assert count >= before + sent, f"Not all emails arrived to MailHog ({count} < {before + sent} after 5s)"
+        self.print_success(f"MailHog received {count} messages")
+
+    def test_imap_connection(self, organizer_bot):
+        """Test 4: Połączenie IMAP"""
+        self.print_test_header("IMAP Connection")
+        
+        connected = self._ensure_connected(organizer_bot)
+        assert connected, "Failed to connect to IMAP server"
+        self.print_success(f"Connected to IMAP server: {organizer_bot.imap_server}")
+        
+        # Sprawdź foldery (tylko subskrybowane - bez skanowania całego drzewa; pełny LIST gdy brak subskrypcji)
+        folders = organizer_bot.get_folders(subscribed_only=True) or organizer_bot.get_folders()
+        assert len(folders) > 0, "No folders found"
+        self.print_info(f"Found {len(folders)} folders: {', '.join(folders[:5])}")
+        
+        # Sprawdź INBOX
+        organizer_bot.imap.select("INBOX")
+        result, data = organizer_bot.imap.search(None, "ALL")
+        assert result == 'OK', "Failed to search INBOX"
+        
+        email_count = len(data[0].split()) if data[0] else 0
+        self.print_success(f"INBOX contains {email_count} emails")
+
+    def test_imap_list_parsing(self, organizer_bot):
+        """Test: Parsowanie IMAP LIST"""
+        self.print_test_header("IMAP LIST Parsing")
+        
+        assert self._ensure_connected(organizer_bot), "Failed to connect to IMAP server"
+        folders = organizer_bot.get_folders()
+        assert len(folders) > 0, "No folders parsed from LIST"
+        assert not any(f.strip() in ('.', '..') for f in folders), "LIST parsing returned dot placeholders"
+        assert any('inbox' in f.lower() for f in folders), "INBOX not found in folders"
+        self.print_success("LIST parsing returned proper folder names")
+
     def test_email_organization(self, organizer_bot):
         """Test 7: Organizacja skrzynki"""
         self.print_test_header("Email Organization")
         
-        try:
-            organizer_bot.connect()
-            
-            # Uruchom organizację (z limitem dla testów)
-            initial_folders = organizer_bot.get_folders()
-            self.print_info(f"Initial folders: {len(initial_folders)}")
-            
-            # Organizuj emaile
-            organizer_bot.organize_mailbox()
-            
-            # Sprawdź nowe foldery
-            final_folders = organizer_bot.get_folders()
-            new_folders = set(final_folders) - set(initial_folders)
-            
-            if new_folders:
-                self.print_success(f"Created {len(new_folders)} new folders: {', '.join(new_folders)}")
-            else:
-                self.print_info("No new folders were needed")
-            
-            # Sprawdź folder SPAM
-            spam_exists = any(('spam' in f.lower()) or ('junk' in f.lower()) for f in final_folders)
-            assert spam_exists, "SPAM/Junk folder not created"
-            self.print_success("SPAM/Junk folder exists")
-            
-        finally:
-            organizer_bot.disconnect()
-    
-    def test_llm_model_loading(self, responder_bot):
+        assert self._ensure_connected(organizer_bot), "Failed to connect to IMAP server"
+        
+        # Uruchom organizację (z limitem dla testów)
+        initial_folders = organizer_bot.get_folders()
+        self.print_info(f"Initial folders: {len(initial_folders)}")
+        
+        # Organizuj emaile
+        organizer_bot.organize_mailbox()
+        
+        # Sprawdź nowe foldery
+        final_folders = organizer_bot.get_folders()
+        new_folders = set(final_folders) - set(initial_folders)
+        
+        if new_folders:
+            self.print_success(f"Created {len(new_folders)} new folders: {', '.join(new_folders)}")
+        else:
+            self.print_info("No new folders were needed")
+        
+        # Sprawdź folder SPAM
+        spam_exists = any(('spam' in f.lower()) or ('junk' in f.lower()) for f in final_folders)
+        assert spam_exists, "SPAM/Junk folder not created"
+        self.print_success("SPAM/Junk folder exists")
+
+    @pytest.mark.skipif(os.environ.get('SKIP_LLM') == '1', reason='LLM disabled (SKIP_LLM=1)')
+    def test_llm_model_loading(self, loaded_responder_bot, test_config):
         """Test 8: Ładowanie modelu LLM"""
         self.print_test_header("LLM Model Loading")
+        responder_bot = loaded_responder_bot
         
-        # Załaduj model
-        loaded = responder_bot.load_model()
+        # Model wczytany już przez fixture - ponowne wywołanie nie może wczytywać wag drugi raz
+        model = responder_bot.model
+        loaded = responder_bot.load_model(local_files_only=test_config['local_files_only'])
         
         if loaded:
             assert responder_bot.model is not None, "Model not loaded properly"
             assert responder_bot.tokenizer is not None, "Tokenizer not loaded properly"
+            assert responder_bot.model is model, "load_model() reloaded an already loaded model"
             self.print_success(f"Model {responder_bot.model_name} loaded successfully")
             self.print_info(f"Using device: {responder_bot.device}")
         else:
             self.print_info("Running in mock mode (no model loaded)")
-    
-    def test_response_generation(self, responder_bot):
+
+    @pytest.mark.skipif(os.environ.get('SKIP_LLM') == '1', reason='LLM disabled (SKIP_LLM=1)')
+    def test_response_generation(self, loaded_responder_bot):
         """Test 9: Generowanie odpowiedzi"""
         self.print_test_header("Response Generation")
+        responder_bot = loaded_responder_bot
         
         # Testowy email
         test_email = {
@@ -543,7 +950,15 @@ class TestEmailBots:
         # Wyświetl fragment odpowiedzi
         self.print_info("Generated response preview:")
         print(f"{Fore.CYAN}{response[:200]}...")
-    
+        
+        # Paczka 3 emaili: jedna odpowiedź na email, w tej samej kolejności
+        batch = [test_email, {**test_email, 'subject': 'Meeting next week'}, {**test_email, 'subject': 'Invoice 42'}]
+        responses = responder_bot.generate_responses_batch(batch, batch_size=2)
+        assert len(responses) == 3 and all(responses), "Batched generation returned empty responses"
+        if responder_bot.model is None:
+            assert responses == [responder_bot._generate_mock_response(e) for e in batch]
+        self.print_success("Batched responses generated")
+
     def test_draft_creation(self, responder_bot):
         """Test 10: Tworzenie draftów"""
         self.print_test_header("Draft Creation")
@@ -570,66 +985,66 @@ class TestEmailBots:
             
         finally:
             responder_bot.disconnect()
-    
-    def test_imap_repair_function(self, organizer_bot):
+
+    def test_imap_repair_function(self, organizer_bot, monkeypatch):
         """Test 11: Funkcja naprawy corruption IMAP"""
         self.print_test_header("IMAP Repair Function")
         
-        try:
-            if organizer_bot.connect():
-                # Test w trybie dry-run (bezpieczny)
-                organizer_bot.dry_run = True
-                
-                # Wywołaj funkcję repair - powinna działać bez błędów
-                try:
-                    organizer_bot.repair_mailbox(
-                        folder='INBOX',
-                        force=True,  # Bez promptu w testach
-                        dry_run=True  # Tylko symulacja
-                    )
-                    self.print_success("Repair function executed in dry-run mode")
-                except Exception as e:
-                    self.print_error(f"Repair function failed: {e}")
-                    pytest.fail(f"Repair function error: {e}")
-                
-                # Test detekcji corruption (może nie być corruption w testach)
-                self.print_info("Testing corruption detection...")
-                
-                # Mock test - sprawdź czy metoda istnieje
-                assert hasattr(organizer_bot, 'repair_mailbox'), "repair_mailbox method missing"
-                self.print_success("Repair method is available")
-                
-            else:
-                self.print_error("Cannot connect organizer for repair test")
-                pytest.fail("Organizer connection failed")
-                
-        finally:
-            organizer_bot.disconnect()
-    
-    def test_full_workflow(self, email_generator, organizer_bot, responder_bot, test_config):
+        if self._ensure_connected(organizer_bot):
+            # Test w trybie dry-run (bezpieczny)
+            monkeypatch.setattr(organizer_bot, 'dry_run', True)
+            
+            # Wywołaj funkcję repair - powinna działać bez błędów
+            try:
+                organizer_bot.repair_mailbox(
+                    folder='INBOX',
+                    force=True,  # Bez promptu w testach
+                    dry_run=True  # Tylko symulacja
+                )
+                self.print_success("Repair function executed in dry-run mode")
+            except Exception as e:
+                self.print_error(f"Repair function failed: {e}")
+                pytest.fail(f"Repair function error: {e}")
+            
+            # Test detekcji corruption (może nie być corruption w testach)
+            self.print_info("Testing corruption detection...")
+            
+            # Mock test - sprawdź czy metoda istnieje
+            assert hasattr(organizer_bot, 'repair_mailbox'), "repair_mailbox method missing"
+            self.print_success("Repair method is available")
+            
+        else:
+            self.print_error("Cannot connect organizer for repair test")
+            pytest.fail("Organizer connection failed")
+
+    def test_full_workflow(self, email_generator, organizer_bot, loaded_responder_bot, test_config):
         """Test 12: Pełny przepływ pracy"""
         self.print_test_header("Full Workflow Test")
         
         # Krok 1: Generuj i wyślij emaile
         self.print_info("Step 1: Generating and sending test emails...")
         email_generator.generate_batch(num_emails=30, spam_ratio=0.25)
-        sent, failed = email_generator.send_all_emails(delay=0.05)
+        # Zapamiętaj najwyższy UID w INBOX - organizacja obejmie tylko nowe wiadomości
+        assert self._ensure_connected(organizer_bot), "Failed to connect to IMAP server"
+        organizer_bot.imap.select("INBOX")
+        typ, data = organizer_bot.imap.uid('SEARCH', None, 'ALL')
+        max_uid_before = max((int(x) for x in data[0].split()), default=0) if typ == 'OK' and data and data[0] else 0
+        before = self._mailhog_count(test_config['mailhog_api'])
+        sent, failed = email_generator.send_all_emails_pooled(delay=0)
         self.print_success(f"Sent {sent} test emails")
         
-        time.sleep(3)  # Czekaj na przetworzenie
+        count = self._wait_for_mailhog(test_config['mailhog_api'], before + sent)  # Czekaj na przetworzenie
+        assert count >= before + sent, f"MailHog has {count} messages after 5s, expected at least {before + sent}"
         
         # Krok 2: Organizuj skrzynkę
         self.print_info("Step 2: Organizing mailbox...")
-        organizer_bot.connect()
-        try:
-            organizer_bot.organize_mailbox()
-            self.print_success("Mailbox organized")
-        finally:
-            organizer_bot.disconnect()
+        assert self._ensure_connected(organizer_bot), "Failed to connect to IMAP server"
+        organizer_bot.organize_mailbox(since_uid=max_uid_before)
+        self.print_success("Mailbox organized")
         
         # Krok 3: Generuj odpowiedzi
         self.print_info("Step 3: Generating responses...")
-        responder_bot.load_model()
+        responder_bot = loaded_responder_bot
         responder_bot.connect()
         try:
             responder_bot.process_emails(
@@ -642,80 +1057,94 @@ class TestEmailBots:
             responder_bot.disconnect()
         
         self.print_success("Full workflow completed successfully!")
-    
-    def test_performance_metrics(self, organizer_bot, responder_bot, test_config):
-        """Test 12: Metryki wydajności"""
-        self.print_test_header("Performance Metrics")
-        
-        metrics = {
-            'organization_time': 0,
-            'response_generation_time': 0,
-            'emails_processed': 0
-        }
-        
-        # Test wydajności organizacji
-        start_time = time.time()
-        organizer_bot.connect()
-        try:
-            organizer_bot.imap.select("INBOX")
-            result, data = organizer_bot.imap.search(None, "ALL")
-            email_ids = data[0].split()[:10]  # Limit do 10 emaili
-            
-            for email_id in email_ids:
-                result, data = organizer_bot.imap.fetch(email_id, "(RFC822)")
-                metrics['emails_processed'] += 1
-            
-        finally:
-            organizer_bot.disconnect()
-        
-        metrics['organization_time'] = time.time() - start_time
-        
-        # Test wydajności generowania odpowiedzi
-        start_time = time.time()
-        test_email = {
-            'from': 'test@example.com',
-            'subject': 'Performance test',
-            'body': 'This is a performance test email.'
-        }
-        response = responder_bot._generate_mock_response(test_email)
-        metrics['response_generation_time'] = time.time() - start_time
-        
-        # Wyświetl metryki
-        self.print_info("Performance Metrics:")
-        print(f"  • Emails processed: {metrics['emails_processed']}")
-        print(f"  • Organization time: {metrics['organization_time']:.2f}s")
-        print(f"  • Response generation: {metrics['response_generation_time']:.3f}s")
+
+    @pytest.mark.skipif(not BENCHMARK_AVAILABLE, reason="pytest-benchmark not installed")
+    def test_bench_imap_fetch(self, benchmark, organizer_bot):
+        """Test 12: Benchmark pobierania do 10 emaili jednym FETCH"""
+        self.print_test_header("Benchmark: IMAP FETCH")
         
-        # Zapisz metryki
-        with open('/app/test-results/performance_metrics.json', 'w') as f:
-            json.dump(metrics, f, indent=2)
+        assert self._ensure_connected(organizer_bot), "Failed to connect to IMAP server"
+        # SELECT zwraca liczbę wiadomości - zakres SEQ bez dodatkowego SEARCH ALL
+        result, data = organizer_bot.imap.select("INBOX")
+        assert result == 'OK'
+        count = min(int(data[0] or 0), 10)  # Limit do 10 emaili
+        if not count:
+            pytest.skip("INBOX is empty")
+        id_set = to_sequence_set(range(1, count + 1))
         
-        self.print_success("Performance metrics saved")
+        result, data = benchmark(organizer_bot.imap.fetch, id_set, "(RFC822)")
+        assert result == 'OK'
+        assert sum(1 for part in data if isinstance(part, tuple)) == count
+        self.print_success(f"Fetched {count} emails per round")
+
+
+def post_process_reports(wait: bool = True) -> List[subprocess.Popen]:
+    """Renderuje raporty HTML (coverage, JUnit) z danych zapisanych przez pytest - równolegle, poza przebiegiem testów."""
+    jobs = []
+    if shutil.which('coverage') and os.path.exists('.coverage'):
+        jobs.append(subprocess.Popen(['coverage', 'html', '-d', '/app/test-results/coverage', '--skip-covered', '--show-contexts']))
+    if shutil.which('junit2html') and os.path.exists('/app/test-results/junit.xml'):
+        jobs.append(subprocess.Popen(['junit2html', '/app/test-results/junit.xml', '/app/test-results/report.html']))
+    if wait:
+        for job in jobs:
+            job.wait()
+    return jobs
+
 
 def run_tests():
-    """Uruchamia wszystkie testy z raportowaniem"""
+    """Uruchamia wszystkie testy z raportowaniem (RUN_MODE=fast|coverage)"""
+    # fast: bez instrumentacji coverage i raportu HTML; coverage: pełne raporty + kontekst per test
+    run_mode = os.environ.get('RUN_MODE', 'fast').strip().lower()
+    
     print(f"\n{Fore.CYAN}{'='*60}")
     print(f"{Fore.YELLOW}🚀 EMAIL AI BOTS - AUTOMATED TEST SUITE")
     print(f"{Fore.CYAN}{'='*60}")
     print(f"{Fore.WHITE}Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"{Fore.WHITE}Mode: {run_mode}")
     print(f"{Fore.CYAN}{'='*60}\n")
     
     # Uruchom pytest z opcjami
     pytest_args = [
         '-v',  # Verbose
-        '--color=yes',  # Kolorowe wyjście
+        '--color=auto',  # Kolorowe wyjście tylko na terminalu
         '--tb=short',  # Krótkie tracebacki
         '--junit-xml=/app/test-results/junit.xml',  # Raport JUnit
-        '--html=/app/test-results/report.html',  # Raport HTML
-        '--self-contained-html',  # Standalone HTML
-        '--cov=.',  # Coverage
-        '--cov-report=html:/app/test-results/coverage',  # Coverage HTML
-        '--cov-report=term',  # Coverage w terminalu
         __file__  # Ten plik
     ]
+    if run_mode == 'coverage':
+        # W trakcie przebiegu tylko raporty maszynowe; HTML renderowany po pytest (post_process_reports)
+        pytest_args[:0] = [
+            '--cov=.',  # Coverage
+            '--cov-context=test',  # Który test pokrył daną linię
+            '--cov-report=xml:/app/test-results/coverage.xml',  # Coverage XML
+            '--cov-report=term',  # Coverage w terminalu
+        ]
+    if BENCHMARK_AVAILABLE:
+        # pytest-benchmark nie mierzy pod xdist - benchmarki idą osobnym, sekwencyjnym przebiegiem
+        pytest_args[:0] = ['--benchmark-skip']
+    if XDIST_AVAILABLE:
+        # loadgroup: testy bez grupy rozchodzą się pojedynczo, grupa "integration" zostaje na jednym workerze
+        pytest_args[:0] = ['-n', 'auto', '--dist=loadgroup']
     
     result = pytest.main(pytest_args)
     
+    if result == 0 and BENCHMARK_AVAILABLE:
+        bench_args = [
+            '-p', 'no:xdist',
+            '--benchmark-only',
+            '--benchmark-json=/app/test-results/benchmark.json',  # Statystyki (mean/stddev/ops)
+            '--benchmark-autosave',  # Historia w .benchmarks/
+            '--tb=short',
+            __file__
+        ]
+        if glob.glob('.benchmarks/*/*.json'):
+            # Regresja średniej > 10% względem ostatniego zapisanego przebiegu to błąd
+            bench_args[:0] = ['--benchmark-compare', '--benchmark-compare-fail=mean:10%']
+        result = pytest.main(bench_args)
+    
+    if run_mode == 'coverage':
+        post_process_reports()
+    
     print(f"\n{Fore.CYAN}{'='*60}")
     if result == 0:
         print(f"{Fore.GREEN}✅ ALL TESTS PASSED!")